@@ -0,0 +1,63 @@
+"""
+Benchmark parse_flight_data_batch against parse_flight_data.
+
+Flight offers are generated by the local Amadeus stub (stubs/amadeus_stub.py),
+so no credentials or network are needed. Both parsers must return identical
+results; the benchmark reports the median time of each per result size.
+
+    python -m benchmarks.bench_flight_parser
+    python -m benchmarks.bench_flight_parser --offers 4 50 250 --repeat 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+# search_flights creates the shared SDK client at import time
+os.environ.setdefault('AMADEUS_CLIENT_ID', 'bench')
+os.environ.setdefault('AMADEUS_CLIENT_SECRET', 'bench')
+
+from stubs.amadeus_stub import create_app  # noqa: E402
+from tools.search_flights import build_flight_search_body, parse_flight_data, parse_flight_data_batch  # noqa: E402
+
+
+async def fetch_offers(count: int):
+    body = build_flight_search_body('TPE', 'NYC', 'BOS', '2025-08-01', '2025-08-09', 1, 1, 2)
+    body['searchCriteria']['maxFlightOffers'] = count
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url='http://stub') as client:
+        response = await client.post('/v2/shopping/flight-offers', json=body,
+                                     headers={'Authorization': 'Bearer bench'})
+        return response.json()['data']
+
+
+def median_time(parse, data, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(data)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, nargs='+', default=[4, 50, 250])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'offers':>8} {'segments':>9} {'legacy ms':>10} {'batch ms':>10} {'speedup':>8}")
+    for count in args.offers:
+        data = asyncio.run(fetch_offers(count))
+        assert parse_flight_data_batch(data) == parse_flight_data(data), "parsers disagree"
+        segments = sum(len(itinerary['segments']) for offer in data for itinerary in offer['itineraries'])
+        legacy = median_time(parse_flight_data, data, args.repeat)
+        batch = median_time(parse_flight_data_batch, data, args.repeat)
+        print(f"{count:>8} {segments:>9} {legacy * 1000:>10.2f} {batch * 1000:>10.2f} {legacy / batch:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
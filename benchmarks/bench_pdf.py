@@ -0,0 +1,89 @@
+"""
+Benchmark trip PDF rendering against itinerary length.
+
+Renders itineraries of increasing length into memory and reports the median
+time per document and per itinerary day; a roughly constant per-day cost
+shows that rendering scales linearly. Also compares `safe_text` with the
+previous chained str.replace implementation.
+
+    python -m benchmarks.bench_pdf
+    python -m benchmarks.bench_pdf --days 10 100 1000 --font /usr/share/fonts/truetype/dejavu/DejaVuSans.ttf
+"""
+import argparse
+import os
+import statistics
+import time
+import timeit
+
+
+def legacy_safe_text(text):
+    return (
+        text.replace("€", "EUR")
+            .replace("•", "-")
+            .replace("–", "-")
+            .replace("—", "-")
+            .encode("latin-1", "replace")
+            .decode("latin-1")
+    )
+
+
+def trip_fields(days: int) -> dict:
+    itinerary = '\n'.join(
+        f'Day {day}: Morning museum visit – lunch near the old town — evening walk • dinner €40'
+        for day in range(1, days + 1)
+    )
+    return {
+        'infants': 0, 'children': 1, 'adults': 2,
+        'orig_city': 'Taipei', 'orig_date': '2025-07-01',
+        'dest_cities': 'Paris, Rome', 'dest_dates': '2025-07-02, 2025-07-05',
+        'local_transport': 'Taxi%20to%20the%20airport', 'city_transport': 'Metro%20day%20pass',
+        'flight': 'BR 87, TPE to CDG\nAZ 333, CDG to FCO',
+        'hotels': 'Paris: Hotel Le Meurice\nRome: Hotel Eden',
+        'itinerary': itinerary,
+    }
+
+
+def time_render(create_trip_pdf, fields, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        create_trip_pdf(**fields, output_path=None)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--font', help='TTF font to benchmark instead of the core fonts (sets PDF_FONT_PATH)')
+    args = parser.parse_args()
+    if args.font:
+        os.environ['PDF_FONT_PATH'] = args.font
+
+    # Imported after PDF_FONT_PATH is set
+    from tools.create_pdf import create_trip_pdf, load_fonts, safe_text
+
+    start = time.perf_counter()
+    load_fonts()
+    print(f"font setup: {(time.perf_counter() - start) * 1000:.1f} ms (once per process)")
+
+    print(f"{'days':>8} {'ms/doc':>10} {'us/day':>10}")
+    per_day = []
+    for days in args.days:
+        elapsed = time_render(create_trip_pdf, trip_fields(days), args.repeat)
+        per_day.append(elapsed / days)
+        print(f"{days:>8} {elapsed * 1000:>10.2f} {elapsed / days * 1e6:>10.1f}")
+    print(f"per-day cost ratio (largest/smallest run): {per_day[-1] / per_day[0]:.2f}")
+
+    unicode_text = trip_fields(200)['itinerary']
+    ascii_text = legacy_safe_text(unicode_text).encode('ascii', 'replace').decode('ascii')
+    for label, text in (('unicode', unicode_text), ('ascii', ascii_text)):
+        assert safe_text(text) == legacy_safe_text(text)
+        legacy = min(timeit.repeat(lambda: legacy_safe_text(text), number=200, repeat=5))
+        current = min(timeit.repeat(lambda: safe_text(text), number=200, repeat=5))
+        print(f"safe_text ({label}): {current / 200 * 1e6:.1f} us vs legacy {legacy / 200 * 1e6:.1f} us per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""
+Load-test the MCP HTTP endpoint with a mixed tools/call workload.
+
+Speaks the streamable-HTTP JSON-RPC protocol like a real client (initialize,
+session header, JSON or SSE responses) and reports throughput, latency
+percentiles and error rates, overall and per tool.
+
+Without --url, the server and the Amadeus/Google stubs are started as
+subprocesses (the stubs replaying benchmarks/fixtures), so the load
+generator never shares an event loop or GIL with the server it measures:
+
+    python -m benchmarks.loadtest --concurrency 32 --duration 30
+    python -m benchmarks.loadtest --mix search_hotels=3,search_flights=2,plan_trip=1 --upstream-latency-ms 150
+    python -m benchmarks.loadtest --rate 50 --duration 60            # open loop: 50 calls/s
+    python -m benchmarks.loadtest --workers 4 --concurrency 64       # multi-worker server
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --concurrency 8
+
+--concurrency runs a closed loop: that many clients each send a call as soon
+as their previous one finishes, which finds the throughput a server
+sustains. --rate sends calls on a fixed schedule regardless of response
+times (at most --concurrency in flight), which shows latency at a given load.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+
+MCP_HEADERS = {'Accept': 'application/json, text/event-stream', 'Content-Type': 'application/json'}
+PROTOCOL_VERSION = '2025-06-18'
+
+DEFAULT_MIX = 'search_hotels=4,search_flights=3,search_multi_city_flights=1,plan_trip=1,create_trip_pdf=1'
+
+# Prefix of a successful google_search result, as tools.google_search.RESULTS_HEADER;
+# kept here so the load generator does not import the server's modules
+GOOGLE_RESULTS_HEADER = "🔍 Google Search Results:"
+
+
+def _trip_pdf(i: int) -> dict:
+    # Rendered PDFs are reused by content, so every call gets a new itinerary
+    return {
+        'infants': 0, 'children': 1, 'adults': 2, 'orig_city': 'Taipei', 'orig_date': '2025-08-01',
+        'dest_cities': 'New York, Boston', 'dest_dates': '2025-08-05, 2025-08-09',
+        'local_transport': 'Taxi', 'city_transport': 'Train',
+        'flight': 'BR 32, TPE to JFK', 'hotels': 'New York: Stub Hotel\nBoston: Stub Hotel',
+        'itinerary': '\n'.join(f'Day {day}: call {i}, museum and dinner' for day in range(1, 10)),
+    }
+
+
+# Arguments of each tool for the i-th call
+WORKLOADS = {
+    'search_flights': lambda i: {
+        'orig_location_code': 'TPE', 'dest_location_code': 'NYC', 'dest2_location_code': 'NYC',
+        'orig_date': '2025-08-01', 'dept_date': '2025-08-09', 'infant_count': 0, 'child_count': 1, 'adult_count': 2},
+    'search_multi_city_flights': lambda i: {
+        'legs_str': 'TPE-NYC,NYC-ORD,ORD-TPE', 'dates_str': '2025-08-01,2025-08-05,2025-08-09',
+        'infant_count': 0, 'child_count': 1, 'adult_count': 2},
+    'search_fare_matrix': lambda i: {
+        'orig_location_code': 'TPE', 'dest_location_code': 'NYC', 'dest2_location_code': 'NYC',
+        'orig_date_from': '2025-08-01', 'orig_date_to': '2025-08-03',
+        'dept_date_from': '2025-08-09', 'dept_date_to': '2025-08-11',
+        'infant_count': 0, 'child_count': 1, 'adult_count': 2},
+    'search_hotels': lambda i: {
+        'city_codes_str': 'NYC,BOS', 'orig_date': '2025-08-01', 'dest_dates_str': '2025-08-05,2025-08-09',
+        'adults': 2},
+    'google_search': lambda i: {'gs_query': 'NYC subway pass'},
+    'plan_trip': lambda i: {
+        'orig_location_code': 'TPE', 'orig_date': '2025-08-01', 'dest_cities_str': 'NYC,BOS',
+        'dest_dates_str': '2025-08-05,2025-08-09', 'infant_count': 0, 'child_count': 1, 'adult_count': 2},
+    'create_trip_pdf': _trip_pdf,
+}
+
+
+def parse_mix(mix: str) -> dict:
+    """Parse "tool=weight,tool=weight" into {tool: weight}."""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown tool {name!r} in mix; choose from {', '.join(WORKLOADS)}")
+        weights[name] = float(weight or 1)
+        if weights[name] <= 0:
+            raise ValueError(f"Weight of {name} must be positive")
+    return weights
+
+
+def _succeeded(tool: str, text: str) -> bool:
+    # google_search reports failures (CAPTCHA, no browser) as its result text
+    if tool == 'google_search':
+        return text.startswith(GOOGLE_RESULTS_HEADER)
+    return True
+
+
+class ToolCallError(Exception):
+    """A tools/call that did not produce a successful result; `kind` names the failure class."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+class MCPClient:
+    """Minimal MCP streamable-HTTP client: one initialized session over a pooled httpx client."""
+
+    def __init__(self, url: str, connections: int, timeout: float):
+        self.endpoint = url.rstrip('/') + '/mcp'
+        self.headers = dict(MCP_HEADERS)
+        self._ids = itertools.count(1)
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        self._http = httpx.AsyncClient(timeout=timeout, limits=limits)
+
+    async def _post(self, message: dict) -> httpx.Response:
+        return await self._http.post(self.endpoint, headers=self.headers, json=message)
+
+    @staticmethod
+    def _decode(response: httpx.Response, request_id: int) -> dict:
+        if response.headers.get('content-type', '').startswith('text/event-stream'):
+            # Progress notifications may precede the response; find the message answering our id
+            for line in response.text.splitlines():
+                if line.startswith('data:'):
+                    message = json.loads(line[5:])
+                    if message.get('id') == request_id:
+                        return message
+            raise ToolCallError('protocol', 'SSE stream ended without a response')
+        return response.json()
+
+    async def request(self, method: str, params: dict) -> dict:
+        request_id = next(self._ids)
+        try:
+            response = await self._post({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+        except httpx.TimeoutException as error:
+            raise ToolCallError('timeout', f"{type(error).__name__}") from error
+        except httpx.TransportError as error:
+            raise ToolCallError('transport', f"{type(error).__name__}: {error}") from error
+        if response.status_code != 200:
+            raise ToolCallError(f'http_{response.status_code}', response.text[:200])
+        message = self._decode(response, request_id)
+        if 'error' in message:
+            raise ToolCallError('jsonrpc', message['error'].get('message', ''))
+        return message['result']
+
+    async def initialize(self):
+        """Open the session; stateful servers answer with a session id that later requests must carry."""
+        request_id = next(self._ids)
+        response = await self._post({'jsonrpc': '2.0', 'id': request_id, 'method': 'initialize', 'params': {
+            'protocolVersion': PROTOCOL_VERSION, 'capabilities': {},
+            'clientInfo': {'name': 'travel-agent-loadtest', 'version': '1.0'},
+        }})
+        response.raise_for_status()
+        result = self._decode(response, request_id)['result']
+        session_id = response.headers.get('mcp-session-id')
+        if session_id:
+            self.headers['mcp-session-id'] = session_id
+        self.headers['mcp-protocol-version'] = result.get('protocolVersion', PROTOCOL_VERSION)
+        await self._post({'jsonrpc': '2.0', 'method': 'notifications/initialized'})
+        return result
+
+    async def list_tools(self):
+        return [tool['name'] for tool in (await self.request('tools/list', {}))['tools']]
+
+    async def call_tool(self, name: str, arguments: dict) -> str:
+        result = await self.request('tools/call', {'name': name, 'arguments': arguments})
+        text = ''.join(block.get('text', '') for block in result.get('content', []))
+        if result.get('isError') or not _succeeded(name, text):
+            raise ToolCallError('tool_error', text[:200])
+        return text
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class Recorder:
+    """Collects the latency and outcome of every call finished inside the measurement window."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.error_samples = {}
+        self.recording = False
+
+    def record(self, tool: str, latency_ms: float, error: ToolCallError = None):
+        if not self.recording:
+            return
+        self.latencies[tool].append(latency_ms)
+        if error is not None:
+            self.errors[tool][error.kind] += 1
+            first_line = str(error).split('\n', 1)[0]
+            self.error_samples.setdefault(error.kind, f"{tool}: {first_line}")
+
+
+async def _timed_call(client: MCPClient, recorder: Recorder, tool: str, call_number: int):
+    start = time.perf_counter()
+    error = None
+    try:
+        await client.call_tool(tool, WORKLOADS[tool](call_number))
+    except ToolCallError as e:
+        error = e
+    except Exception as e:
+        error = ToolCallError('client', f"{type(e).__name__}: {e}")
+    recorder.record(tool, (time.perf_counter() - start) * 1000, error)
+
+
+async def closed_loop(client, recorder, choose, concurrency: int, deadline: float):
+    counter = itertools.count()
+
+    async def worker():
+        while time.monotonic() < deadline:
+            await _timed_call(client, recorder, choose(), next(counter))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(client, recorder, choose, rate: float, max_in_flight: int, deadline: float):
+    """Start calls at `rate` per second; arrivals that find `max_in_flight` calls running are counted as dropped."""
+    in_flight = set()
+    dropped = 0
+    interval = 1 / rate
+    next_start = time.monotonic()
+    for call_number in itertools.count():
+        if next_start >= deadline:
+            break
+        await asyncio.sleep(max(0.0, next_start - time.monotonic()))
+        next_start += interval
+        if len(in_flight) >= max_in_flight:
+            dropped += recorder.recording
+            continue
+        task = asyncio.create_task(_timed_call(client, recorder, choose(), call_number))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return dropped
+
+
+def _percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def summarize(latencies, errors: dict, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    failed = sum(errors.values())
+    return {
+        'calls': len(ordered),
+        'errors': failed,
+        'error_rate': failed / len(ordered) if ordered else 0.0,
+        'throughput': len(ordered) / elapsed,
+        'p50_ms': _percentile(ordered, 0.50),
+        'p95_ms': _percentile(ordered, 0.95),
+        'p99_ms': _percentile(ordered, 0.99),
+        'max_ms': ordered[-1] if ordered else 0.0,
+        'error_kinds': dict(errors),
+    }
+
+
+def report(results: dict):
+    print(f"\n{'tool':<28} {'calls':>7} {'req/s':>8} {'err %':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in results['tools'].items():
+        print(f"{name:<28} {stats['calls']:>7} {stats['throughput']:>8.1f} {stats['error_rate'] * 100:>6.1f}"
+              f" {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+    total = results['total']
+    print(f"{'total':<28} {total['calls']:>7} {total['throughput']:>8.1f} {total['error_rate'] * 100:>6.1f}"
+          f" {total['p50_ms']:>9.1f} {total['p95_ms']:>9.1f} {total['p99_ms']:>9.1f} {total['max_ms']:>9.1f}")
+    if results.get('dropped'):
+        print(f"{results['dropped']} arrivals dropped: --concurrency calls were already in flight")
+    for kind, sample in results['error_samples'].items():
+        print(f"  {kind}: {sample}")
+
+
+async def run_load(args, weights: dict) -> dict:
+    client = MCPClient(args.url, args.concurrency, args.timeout)
+    try:
+        await client.initialize()
+        available = await client.list_tools()
+        missing = [name for name in weights if name not in available]
+        if missing:
+            raise SystemExit(f"Server does not offer {', '.join(missing)}")
+
+        names, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+        rng = random.Random(args.seed)
+
+        def choose():
+            return rng.choices(names, cum_weights=cumulative)[0]
+
+        recorder = Recorder()
+        mode = f"{args.rate:g} calls/s" if args.rate else f"{args.concurrency} clients"
+        print(f"{args.url}: {mode}, warm-up {args.warmup:g}s, measuring {args.duration:g}s")
+
+        async def measure():
+            await asyncio.sleep(args.warmup)
+            recorder.recording = True
+            start = time.monotonic()
+            await asyncio.sleep(args.duration)
+            recorder.recording = False
+            return time.monotonic() - start
+
+        deadline = time.monotonic() + args.warmup + args.duration
+        if args.rate:
+            load = open_loop(client, recorder, choose, args.rate, args.concurrency, deadline)
+        else:
+            load = closed_loop(client, recorder, choose, args.concurrency, deadline)
+        elapsed, dropped = await asyncio.gather(measure(), load)
+    finally:
+        await client.aclose()
+
+    all_latencies = [latency for samples in recorder.latencies.values() for latency in samples]
+    all_errors = defaultdict(int)
+    for kinds in recorder.errors.values():
+        for kind, count in kinds.items():
+            all_errors[kind] += count
+    return {
+        'url': args.url,
+        'mode': 'open' if args.rate else 'closed',
+        'concurrency': args.concurrency,
+        'rate': args.rate,
+        'duration_s': elapsed,
+        'mix': weights,
+        'dropped': dropped or 0,
+        'tools': {name: summarize(recorder.latencies[name], recorder.errors[name], elapsed)
+                  for name in weights if recorder.latencies[name]},
+        'total': summarize(all_latencies, all_errors, elapsed),
+        'error_samples': recorder.error_samples,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_local_stack(args) -> list:
+    """
+    Start the stubs and the server as subprocesses; set args.url to the server
+    and args.scratch to the directory holding its files. Returns the processes.
+    """
+    amadeus_port, google_port, server_port = _free_port(), _free_port(), _free_port()
+    scratch = args.scratch = tempfile.mkdtemp(prefix='travel-loadtest-')
+    env = dict(os.environ, SERVER_HOST='127.0.0.1', SERVER_PORT=str(server_port), SERVER_WORKERS=str(args.workers))
+    # Point the server at the stubs; caches are off unless set, so every call reaches the stubs
+    for name, value in {
+        'AMADEUS_CLIENT_ID': 'loadtest',
+        'AMADEUS_CLIENT_SECRET': 'loadtest',
+        'AMADEUS_BASE_URL': f'http://127.0.0.1:{amadeus_port}',
+        'GOOGLE_SEARCH_BASE_URL': f'http://127.0.0.1:{google_port}',
+        'AMADEUS_RATE_LIMIT': '100000',
+        'FLIGHT_CACHE_TTL': '0',
+        'GOOGLE_SEARCH_CACHE_TTL': '0',
+        'LOG_LEVEL': 'WARNING',
+        'SHARED_CACHE_DB': os.path.join(scratch, 'shared_cache.sqlite3'),
+        'AMADEUS_TOKEN_FILE': os.path.join(scratch, 'amadeus_token.json'),
+        'HOTEL_DIRECTORY_DB': os.path.join(scratch, 'hotel_directory.sqlite3'),
+        'PDF_OUTPUT_DIR': os.path.join(scratch, 'output'),
+    }.items():
+        env.setdefault(name, value)
+    latency = str(args.upstream_latency_ms)
+    commands = [
+        ([sys.executable, '-m', 'stubs.amadeus_stub', '--port', str(amadeus_port), '--latency-ms', latency,
+          '--fixtures', FIXTURES_DIR], f'http://127.0.0.1:{amadeus_port}/'),
+        ([sys.executable, '-m', 'stubs.google_stub', '--port', str(google_port), '--latency-ms', latency],
+         f'http://127.0.0.1:{google_port}/'),
+        ([sys.executable, 'server.py'], f'http://127.0.0.1:{server_port}/stats'),
+    ]
+    processes = []
+    try:
+        for command, ready_url in commands:
+            process = subprocess.Popen(command, cwd=REPO_DIR, env=env,
+                                       stdout=None if args.verbose else subprocess.DEVNULL,
+                                       stderr=None if args.verbose else subprocess.DEVNULL)
+            processes.append(process)
+            _wait_until_up(ready_url, process)
+    except BaseException:
+        stop_local_stack(processes)
+        raise
+    args.url = f'http://127.0.0.1:{server_port}'
+    return processes
+
+
+def stop_local_stack(processes):
+    for process in reversed(processes):
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+    for process in reversed(processes):
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='server to load (default: start the server and stubs locally)')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'weighted tools to call, tool=weight,... (default: {DEFAULT_MIX})')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='clients in the closed loop, or the in-flight cap with --rate')
+    parser.add_argument('--rate', type=float, help='open loop: start this many calls per second')
+    parser.add_argument('--duration', type=float, default=20, help='seconds measured')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds of load before measuring')
+    parser.add_argument('--timeout', type=float, default=60, help='per-call timeout in seconds')
+    parser.add_argument('--upstream-latency-ms', type=float, default=100,
+                        help='stub response delay when starting the local stack')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='server worker processes (SERVER_WORKERS) when starting the local stack')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the tool mix')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    parser.add_argument('--verbose', action='store_true', help='show the local server and stub logs')
+    args = parser.parse_args()
+
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.rate is not None and args.rate <= 0:
+        parser.error('--rate must be positive')
+
+    processes = [] if args.url else start_local_stack(args)
+    try:
+        results = asyncio.run(run_load(args, weights))
+    finally:
+        stop_local_stack(processes)
+        if processes:
+            shutil.rmtree(args.scratch, ignore_errors=True)
+
+    report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
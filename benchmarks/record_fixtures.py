@@ -0,0 +1,118 @@
+"""
+Record the Amadeus responses and Google results page used by the benchmarks.
+
+By default the responses come from the local Amadeus stub, so the fixtures
+are reproducible offline. With --live they are recorded from the Amadeus API
+configured in the environment (AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET,
+AMADEUS_HOSTNAME), and --serp-query saves the Google results page for a
+query through the headless browser pool.
+
+    python -m benchmarks.record_fixtures
+    python -m benchmarks.record_fixtures --live --serp-query "NYC subway pass"
+"""
+import argparse
+import asyncio
+import html
+import json
+import os
+
+import httpx
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# search_flights creates the shared SDK client at import time
+os.environ.setdefault('AMADEUS_CLIENT_ID', 'bench')
+os.environ.setdefault('AMADEUS_CLIENT_SECRET', 'bench')
+
+from stubs.amadeus_stub import create_app  # noqa: E402
+from tools.search_flights import build_flight_search_body  # noqa: E402
+
+
+class _StubClient:
+    """Just enough of AsyncAmadeusClient.request to record from the in-process stub."""
+
+    def __init__(self):
+        self._http = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app()), base_url='http://stub',
+                                       headers={'Authorization': 'Bearer record'})
+
+    async def request(self, method, path, params=None, body=None, **_):
+        response = await self._http.request(method, path, params=params, json=body)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+async def record_amadeus(client, args):
+    body = build_flight_search_body(args.origin, args.destination, args.destination, args.depart, args.back, 0, 1, 2)
+    body['searchCriteria']['maxFlightOffers'] = args.offers
+    flights = await client.request('POST', '/v2/shopping/flight-offers', body=body)
+
+    hotels = await client.request('GET', '/v1/reference-data/locations/hotels/by-city',
+                                  params={'cityCode': args.destination})
+    hotel_ids = ','.join(hotel['hotelId'] for hotel in hotels['data'][:args.hotels])
+    offers = await client.request('GET', '/v3/shopping/hotel-offers', params={
+        'hotelIds': hotel_ids, 'adults': 2, 'checkInDate': args.depart, 'checkOutDate': args.back, 'roomQuantity': 1,
+    })
+    return {'flight_offers': flights, 'hotel_offers': offers}
+
+
+async def record_serp(query: str) -> str:
+    from tools.browser_pool import BrowserPool
+    from tools.google_search import GOOGLE_BASE_URL, RESULTS_READY_SELECTOR
+    from urllib.parse import quote_plus
+
+    pool = BrowserPool(size=1)
+    try:
+        async with pool.page() as page:
+            await page.goto(f"{GOOGLE_BASE_URL}/search?q={quote_plus(query)}&hl=en&num=10",
+                            wait_until='domcontentloaded')
+            await page.wait_for_selector(RESULTS_READY_SELECTOR, state='attached')
+            content = await page.content()
+    finally:
+        await pool.close()
+    # The Google stub substitutes the requested query back in
+    return content.replace(html.escape(query), '{query}')
+
+
+async def record(args):
+    if args.live:
+        from tools.amadeus_client import AsyncAmadeusClient
+        client = AsyncAmadeusClient.from_env()
+    else:
+        client = _StubClient()
+    try:
+        documents = await record_amadeus(client, args)
+    finally:
+        await client.aclose()
+    for name, document in documents.items():
+        path = os.path.join(args.output, f'{name}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, separators=(',', ':'))
+        print(f"{path}: {len(document['data'])} records")
+    if args.serp_query:
+        path = os.path.join(args.output, 'serp.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(await record_serp(args.serp_query))
+        print(f"{path}: results page for {args.serp_query!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--live', action='store_true', help='record from the configured Amadeus API')
+    parser.add_argument('--serp-query', help='also record the Google results page for this query')
+    parser.add_argument('--output', default=FIXTURES_DIR)
+    parser.add_argument('--origin', default='TPE')
+    parser.add_argument('--destination', default='NYC')
+    parser.add_argument('--depart', default='2025-08-01')
+    parser.add_argument('--back', default='2025-08-09')
+    parser.add_argument('--offers', type=int, default=250, help='flight offers to request (max 250)')
+    parser.add_argument('--hotels', type=int, default=40, help='hotels to request offers for')
+    args = parser.parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    asyncio.run(record(args))
+
+
+if __name__ == "__main__":
+    main()
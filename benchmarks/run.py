@@ -0,0 +1,350 @@
+"""
+Offline benchmark suite.
+
+Runs entirely against recorded fixtures (benchmarks/fixtures) and local stub
+servers, so it needs no credentials or network:
+
+    parse    parse/format time of the flight and hotel helpers on the fixtures
+    tools    latency of each MCP tool over HTTP, server and stubs in-process
+    scaling  throughput and latency of the HTTP app as concurrent clients grow
+
+Results are written to benchmarks/results/<commit>.json; pass --compare with
+an earlier result file (or commit) to see the change of every metric and,
+with --fail-on-regression, exit non-zero when one got worse than --threshold.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --suite parse tools --compare benchmarks/results/1a2b3c4.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import httpx
+import uvicorn
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# The tools read their configuration at import time. Defaults point them at
+# the stubs and a scratch directory, and disable the result caches so every
+# call exercises the full path; render pool workers inherit these settings.
+_SCRATCH = tempfile.mkdtemp(prefix='travel-bench-')
+for _name, _value in {
+    'AMADEUS_CLIENT_ID': 'bench',
+    'AMADEUS_CLIENT_SECRET': 'bench',
+    'AMADEUS_BASE_URL': f'http://127.0.0.1:{_free_port()}',
+    'AMADEUS_RATE_LIMIT': '100000',
+    'GOOGLE_SEARCH_BASE_URL': f'http://127.0.0.1:{_free_port()}',
+    'FLIGHT_CACHE_TTL': '0',
+    'GOOGLE_SEARCH_CACHE_TTL': '0',
+    'HOTEL_DIRECTORY_DB': os.path.join(_SCRATCH, 'hotel_directory.sqlite3'),
+    'PDF_OUTPUT_DIR': os.path.join(_SCRATCH, 'output'),
+    'MCP_STREAMING': '0',
+    'LOG_LEVEL': 'WARNING',
+}.items():
+    os.environ.setdefault(_name, _value)
+
+MCP_HEADERS = {'Accept': 'application/json, text/event-stream', 'Content-Type': 'application/json'}
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _metric(value: float, unit: str, better: str = 'lower') -> dict:
+    return {'value': round(value, 4), 'unit': unit, 'better': better}
+
+
+def _percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _time_per_call_ms(function, repeat: int) -> float:
+    """Median over `repeat` runs of the mean time per call, with enough calls per run to time reliably."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return statistics.median(timer.repeat(repeat=repeat, number=number)) / number * 1000
+
+
+def run_parse(args) -> dict:
+    from tools.search_flights import (flight_offers_json, flight_summary, parse_flight_data,
+                                      parse_flight_data_batch, prune_flight_offers, render_flight_offers)
+    from tools.search_hotels import convert_hotel_offers_to_text
+
+    flights = _load_fixture('flight_offers.json')['data']
+    hotels = _load_fixture('hotel_offers.json')['data']
+    parsed = parse_flight_data_batch(flights)
+    # Hand-written offers missing optional fields; fail here rather than time helpers that reject them
+    sparse = _load_fixture('flight_offers_sparse.json')['data']
+    for check in (parse_flight_data_batch, prune_flight_offers, flight_offers_json):
+        check(sparse)
+    cases = {
+        'parse_flight_data': lambda: parse_flight_data(flights),
+        'parse_flight_data_batch': lambda: parse_flight_data_batch(flights),
+        'flight_summary': lambda: flight_summary(parsed),
+        'render_flight_offers_text': lambda: render_flight_offers(flights, 'text', limit=4),
+        'prune_flight_offers': lambda: prune_flight_offers(flights),
+        'flight_offers_json': lambda: flight_offers_json(flights),
+        'convert_hotel_offers_to_text': lambda: convert_hotel_offers_to_text(hotels),
+    }
+    results = {}
+    for name, function in cases.items():
+        results[f'parse.{name}.ms'] = _metric(_time_per_call_ms(function, args.repeat), 'ms')
+        print(f"  {name:<30} {results[f'parse.{name}.ms']['value']:>9.3f} ms/call")
+    print(f"  ({len(flights)} flight offers, {len(hotels)} hotels)")
+    return results
+
+
+class ServerThread:
+    """Run an ASGI app with uvicorn on a background thread for the duration of a `with` block."""
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Server thread exited during startup")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def call_tool(client: httpx.AsyncClient, name: str, arguments: dict) -> str:
+    """Call an MCP tool over the streamable HTTP transport and return its text result."""
+    response = await client.post('/mcp', headers=MCP_HEADERS, json={
+        'jsonrpc': '2.0', 'id': 1, 'method': 'tools/call', 'params': {'name': name, 'arguments': arguments},
+    })
+    response.raise_for_status()
+    document = response.json()
+    if 'error' in document:
+        raise RuntimeError(document['error'].get('message'))
+    text = document['result']['content'][0]['text']
+    if document['result'].get('isError'):
+        raise RuntimeError(text[:200])
+    return text
+
+
+def _tool_cases():
+    flights = {'orig_location_code': 'TPE', 'dest_location_code': 'NYC', 'dest2_location_code': 'NYC',
+               'orig_date': '2025-08-01', 'dept_date': '2025-08-09',
+               'infant_count': 0, 'child_count': 1, 'adult_count': 2}
+    return {
+        'search_flights': lambda i: ('search_flights', flights),
+        'search_multi_city_flights': lambda i: ('search_multi_city_flights', {
+            'legs_str': 'TPE-NYC,NYC-ORD,ORD-TPE', 'dates_str': '2025-08-01,2025-08-05,2025-08-09',
+            'infant_count': 0, 'child_count': 1, 'adult_count': 2}),
+        'search_hotels': lambda i: ('search_hotels', {
+            'city_codes_str': 'NYC,BOS', 'orig_date': '2025-08-01', 'dest_dates_str': '2025-08-05,2025-08-09',
+            'adults': 2}),
+        'google_search': lambda i: ('google_search', {'gs_query': 'NYC subway pass'}),
+        'plan_trip': lambda i: ('plan_trip', {
+            'orig_location_code': 'TPE', 'orig_date': '2025-08-01', 'dest_cities_str': 'NYC,BOS',
+            'dest_dates_str': '2025-08-05,2025-08-09', 'infant_count': 0, 'child_count': 1, 'adult_count': 2}),
+        # Rendered PDFs are reused by content, so every call gets a new itinerary
+        'create_trip_pdf': lambda i: ('create_trip_pdf', {
+            'infants': 0, 'children': 1, 'adults': 2, 'orig_city': 'Taipei', 'orig_date': '2025-08-01',
+            'dest_cities': 'New York, Boston', 'dest_dates': '2025-08-05, 2025-08-09',
+            'local_transport': 'Taxi', 'city_transport': 'Train',
+            'flight': 'BR 32, TPE to JFK', 'hotels': 'New York: Stub Hotel\nBoston: Stub Hotel',
+            'itinerary': '\n'.join(f'Day {day}: run {i}, museum and dinner' for day in range(1, 10))}),
+    }
+
+
+async def _tool_latencies(base_url: str, calls: int, started: float):
+    from tools.google_search import RESULTS_HEADER
+
+    results = {}
+    cases = _tool_cases()
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        for name, case in cases.items():
+            # First call warms pools and the hotel directory; a failure means the tool cannot run here
+            try:
+                text = await call_tool(client, *case(-1))
+                # google_search reports failures (e.g. no browser installed) as its result text
+                if name == 'google_search' and not text.startswith(RESULTS_HEADER):
+                    raise RuntimeError(text.splitlines()[0])
+            except Exception as error:
+                print(f"  {name:<30} skipped: {error}")
+                continue
+            samples = []
+            for i in range(calls):
+                start = time.perf_counter()
+                await call_tool(client, *case(started + i))
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            results[f'tools.{name}.p50_ms'] = _metric(_percentile(samples, 0.5), 'ms')
+            results[f'tools.{name}.p95_ms'] = _metric(_percentile(samples, 0.95), 'ms')
+            print(f"  {name:<30} p50 {samples[len(samples) // 2]:>8.1f} ms  p95 {_percentile(samples, 0.95):>8.1f} ms")
+    return results
+
+
+async def _scaling(base_url: str, levels, per_client: int):
+    results = {}
+    name, arguments = _tool_cases()['search_hotels'](0)
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await call_tool(client, name, arguments)
+        for level in levels:
+            samples = []
+
+            async def worker():
+                for _ in range(per_client):
+                    start = time.perf_counter()
+                    await call_tool(client, name, arguments)
+                    samples.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(level)))
+            elapsed = time.perf_counter() - start
+            samples.sort()
+            throughput = len(samples) / elapsed
+            results[f'scaling.c{level}.rps'] = _metric(throughput, 'req/s', better='higher')
+            results[f'scaling.c{level}.p95_ms'] = _metric(_percentile(samples, 0.95), 'ms')
+            print(f"  {level:>3} clients  {throughput:>8.1f} req/s  p50 {samples[len(samples) // 2]:>8.1f} ms"
+                  f"  p95 {_percentile(samples, 0.95):>8.1f} ms")
+    return results
+
+
+def run_http(args, suites) -> dict:
+    from stubs import amadeus_stub, google_stub
+    import server
+
+    # mcp logs a ClosedResourceError after every stateless JSON response; it is noise here
+    logging.getLogger('mcp.server.streamable_http').setLevel(logging.CRITICAL)
+
+    amadeus = amadeus_stub.create_app(fixtures=FIXTURES_DIR)
+    google = google_stub.create_app()
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    results = {}
+    with ServerThread(amadeus, int(os.environ['AMADEUS_BASE_URL'].rsplit(':', 1)[1])), \
+            ServerThread(google, int(os.environ['GOOGLE_SEARCH_BASE_URL'].rsplit(':', 1)[1])), \
+            ServerThread(server.app, port):
+        if 'tools' in suites:
+            print("tools (stub latency 0 ms):")
+            results.update(asyncio.run(_tool_latencies(base_url, args.calls, time.time())))
+        if 'scaling' in suites:
+            # Upstream latency is what concurrency has to overlap
+            amadeus.state.latency_ms = args.upstream_latency_ms
+            print(f"scaling (search_hotels, stub latency {args.upstream_latency_ms:.0f} ms):")
+            results.update(asyncio.run(_scaling(base_url, args.concurrency, args.per_client)))
+    return results
+
+
+def _git(*command) -> str:
+    try:
+        return subprocess.run(['git', *command], cwd=BENCH_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def environment() -> dict:
+    return {
+        'commit': _git('rev-parse', '--short', 'HEAD') or 'unknown',
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def _resolve_baseline(reference: str) -> str:
+    if os.path.exists(reference):
+        return reference
+    path = os.path.join(RESULTS_DIR, f"{_git('rev-parse', '--short', reference) or reference}.json")
+    if not os.path.exists(path):
+        raise SystemExit(f"No benchmark results for {reference!r} (looked for {path})")
+    return path
+
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """Print the change of every shared metric; return the names of metrics that regressed beyond `threshold` %."""
+    regressions = []
+    print(f"\nvs {baseline['environment']['commit']} ({baseline['environment']['timestamp']}):")
+    print(f"  {'metric':<45} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, metric in current['metrics'].items():
+        before = baseline['metrics'].get(name)
+        if before is None or not before['value']:
+            continue
+        change = (metric['value'] - before['value']) / before['value'] * 100
+        worse = change > threshold if metric['better'] == 'lower' else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"  {name:<45} {before['value']:>10.3f} {metric['value']:>10.3f} {change:>+7.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', nargs='+', choices=['parse', 'tools', 'scaling'],
+                        default=['parse', 'tools', 'scaling'])
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per parse case')
+    parser.add_argument('--calls', type=int, default=20, help='calls per tool in the tools suite')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--per-client', type=int, default=10, help='sequential calls per client in the scaling suite')
+    parser.add_argument('--upstream-latency-ms', type=float, default=50)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier result file or commit to compare against')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change counted as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    # Read the baseline first: it may be the file this run is about to overwrite
+    baseline = None
+    if args.compare:
+        with open(_resolve_baseline(args.compare), encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    metrics = {}
+    if 'parse' in args.suite:
+        print("parse:")
+        metrics.update(run_parse(args))
+    if {'tools', 'scaling'} & set(args.suite):
+        metrics.update(run_http(args, set(args.suite)))
+
+    result = {'environment': environment(), 'suites': args.suite, 'metrics': metrics}
+    commit = result['environment']['commit'] + ('-dirty' if result['environment']['dirty'] else '')
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if baseline is not None:
+        regressions = compare(baseline, result, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0f}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,207 @@
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 import os
+import sys
+import time
 import uvicorn
-from starlette.responses import FileResponse, JSONResponse
+from starlette.responses import FileResponse, JSONResponse, Response
 from starlette.routing import Route
-from tools.search_flights import search_flights as _search_flights
+from tools.search_flights import async_search_flights as _async_search_flights
+from tools.search_flights import flight_cache_stats as _flight_cache_stats
+from tools.fare_matrix import async_fare_matrix as _async_fare_matrix
+from tools.multi_city import async_search_multi_city as _async_search_multi_city
+from tools.plan_trip import async_plan_trip as _async_plan_trip
 from tools.google_search import async_google_search as _async_google_search
-from tools.search_hotels import search_hotels as _search_hotels
-from tools.search_hotels import convert_hotel_offers_to_text as _convert_hotel_offers_to_text
-from tools.create_pdf import create_trip_pdf as _create_trip_pdf
+from tools.google_search import search_phase_stats as _search_phase_stats
+from tools.google_search import search_cache_stats as _search_cache_stats
+from tools.search_hotels import async_search_trip_hotels as _async_search_trip_hotels
+from tools.search_hotels import preload_hotel_directory
+from tools.create_pdf import async_create_trip_pdf as _async_create_trip_pdf
+from tools.create_pdf import resolve_output_file, shutdown_render_pool
+from tools.artifact_store import artifact_response, artifact_store, artifact_store_stats
+from tools.browser_pool import get_browser_pool
+from tools.amadeus_client import close_async_client, get_async_client
+from tools.tracing import MemoryExporter, get_tracer, span
+from tools.metrics import (CONTENT_TYPE, REGISTRY, TOOL_CALLS, TOOL_IN_FLIGHT, TOOL_LATENCY, cache_collector,
+                           render_metrics, scheduler_collector)
 
-mcp = FastMCP('travel-agent-mcp-server', json_response=True, stateless_http=True)
+# Leveled logging for the server and tools; DEBUG adds request bodies and per-phase timings
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL,
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+# httpx logs every upstream request at INFO; keep that for DEBUG only
+if not logging.getLogger().isEnabledFor(logging.DEBUG):
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
+# Answer tool calls over SSE so partial results stream as progress notifications;
+# off by default, which returns a single JSON response per call
+MCP_STREAMING = os.getenv('MCP_STREAMING', '0') == '1'
+
+async def _warm_browser_pool():
+    try:
+        await get_browser_pool().start()
+    except Exception as e:
+        # Keep non-browser tools usable; google_search retries the launch on demand
+        logger.warning("Browser pool failed to start: %s", e)
+
+async def _start_amadeus_client():
+    try:
+        await get_async_client().start()
+    except Exception as e:
+        # Requests will retry the token fetch inline
+        logger.warning("Amadeus token prefetch failed: %s", e)
+
+@asynccontextmanager
+async def lifespan(server):
+    # FastMCP enters this once per session (once per request when stateless).
+    # app_lifespan already warmed the process-wide pool at boot; retrying a
+    # failed launch here would add it to every call, serialized on the pool lock.
+    yield {'browser_pool': get_browser_pool()}
+
+class ToolMetricsMiddleware(Middleware):
+    """Record latency, outcome and concurrency of every MCP tool call."""
+
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        logger.debug("%s called", tool)
+        status = 'error'
+        start = time.perf_counter()
+        with TOOL_IN_FLIGHT.track_inprogress(tool=tool):
+            try:
+                result = await call_next(context)
+                status = 'ok'
+                return result
+            finally:
+                TOOL_LATENCY.observe(time.perf_counter() - start, tool=tool)
+                TOOL_CALLS.inc(tool=tool, status=status)
+
+class ToolTracingMiddleware(Middleware):
+    """Run every MCP tool call in a root span; the tools' spans nest under it."""
+
+    async def on_call_tool(self, context, call_next):
+        with span(f'tool.{context.message.name}'):
+            return await call_next(context)
+
+mcp = FastMCP('travel-agent-mcp-server', json_response=not MCP_STREAMING, stateless_http=True, lifespan=lifespan)
+mcp.add_middleware(ToolMetricsMiddleware())
+mcp.add_middleware(ToolTracingMiddleware())
+
+def _progress_reporter(ctx: Context):
+    """
+    Callback that sends each partial result as an MCP progress notification
+    (with the result in `message`); None unless MCP_STREAMING is enabled.
+    Clients only receive notifications when they send a progressToken.
+    """
+    if not MCP_STREAMING:
+        return None
+    done = 0
+
+    async def report(block: str, total: int = None):
+        nonlocal done
+        done += 1
+        try:
+            await ctx.report_progress(done, total, block)
+        except Exception as e:
+            # The final tool result still carries everything
+            logger.warning("Progress notification failed: %s", e)
+    return report
 
 @mcp.tool
-def search_flights(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
-                   orig_date: str, dept_date: str,
-                   infant_count: int, child_count: int, adult_count: int) -> str:
-    print('search flights called')
-    return _search_flights(orig_location_code, dest_location_code, dest2_location_code,
-                                orig_date, dept_date,
-                                infant_count, child_count, adult_count)
+async def search_flights(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
+                         orig_date: str, dept_date: str,
+                         infant_count: int, child_count: int, adult_count: int,
+                         output_format: str = 'text', fields: str = '',
+                         limit: int = 0, offset: int = 0, ctx: Context = None) -> str:
+    """
+    Search round-trip flight offers, best first.
+
+    Offers are ranked on price, total duration, stops and layover time, and
+    the best `limit` (default 4) are returned; pass `offset` to page through
+    more options. output_format='json' returns compact JSON ({"offers": [...]})
+    instead of the text summary; `fields` optionally restricts each offer to a
+    comma-separated subset of: id, price, lastTicketingDate,
+    numberOfBookableSeats, itineraries, cabin, includedBags, includedBagWeight.
+    Fields an offer does not carry are null.
+    """
+    return await _async_search_flights(orig_location_code, dest_location_code, dest2_location_code,
+                                       orig_date, dept_date,
+                                       infant_count, child_count, adult_count,
+                                       output_format=output_format, fields=fields,
+                                       limit=limit, offset=offset, on_result=_progress_reporter(ctx))
+
+
+@mcp.tool
+async def search_fare_matrix(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
+                             orig_date_from: str, orig_date_to: str, dept_date_from: str, dept_date_to: str,
+                             infant_count: int, child_count: int, adult_count: int,
+                             output_format: str = 'text') -> str:
+    """
+    Find the cheapest travel dates: the lowest round-trip fare for every
+    departure date in orig_date_from..orig_date_to combined with every return
+    date in dept_date_from..dept_date_to (YYYY-MM-DD, inclusive).
+    """
+    return await _async_fare_matrix(orig_location_code, dest_location_code, dest2_location_code,
+                                    orig_date_from, orig_date_to, dept_date_from, dept_date_to,
+                                    infant_count, child_count, adult_count, output_format=output_format)
+
+
+@mcp.tool
+async def search_multi_city_flights(legs_str: str, dates_str: str,
+                                    infant_count: int, child_count: int, adult_count: int,
+                                    output_format: str = 'text', fields: str = '',
+                                    limit: int = 0, offset: int = 0, ctx: Context = None) -> str:
+    """
+    Search a multi-city trip with any number of legs, priced as one itinerary.
+    legs_str lists the legs in travel order as ORIGIN-DESTINATION IATA pairs,
+    e.g. "TPE-NYC,NYC-ORD,ORD-LAX,LAX-TPE"; dates_str gives one departure date
+    (YYYY-MM-DD) per leg, e.g. "2025-08-01,2025-08-05,2025-08-09,2025-08-15".
+    output_format, fields, limit and offset work as in search_flights.
+    """
+    return await _async_search_multi_city(legs_str, dates_str, infant_count, child_count, adult_count,
+                                          output_format=output_format, fields=fields,
+                                          limit=limit, offset=offset, on_result=_progress_reporter(ctx))
     
     
 @mcp.tool
-async def google_search(gs_query: str) -> str:
+async def google_search(gs_query: str, ctx: Context = None) -> str:
     """Google searches the prompt"""
-    return await _async_google_search(gs_query)
+    return await _async_google_search(gs_query, on_result=_progress_reporter(ctx))
 
 @mcp.tool
-def search_hotels(city_codes_str: str, orig_date: str, dest_dates_str: str, adults: int) -> str:
+async def search_hotels(city_codes_str: str, orig_date: str, dest_dates_str: str, adults: int,
+                        ctx: Context = None) -> str:
     """
     Search hotels in a city using Amadeus hotel search.
     """
-    print('search hotels called')
-    city_codes = city_codes_str.split(',')
-    dest_dates = dest_dates_str.split(',')
-    ret = ''
-    for i, city_code in enumerate(city_codes):
-        check_in = orig_date if i == 0 else dest_dates[i - 1]
-        check_out = dest_dates[i]
-        hotels_with_offers = _search_hotels(city_code, check_in, check_out, adults)
-        ret += f"# Hotels in {city_code} from {check_in} to {check_out}:\n"
-        ret += _convert_hotel_offers_to_text(hotels_with_offers) + "\n\n"
-    return ret
+    return await _async_search_trip_hotels(city_codes_str, orig_date, dest_dates_str, adults,
+                                           on_result=_progress_reporter(ctx))
 
 @mcp.tool
-def create_trip_pdf(
+async def plan_trip(orig_location_code: str, orig_date: str, dest_cities_str: str, dest_dates_str: str,
+                    infant_count: int, child_count: int, adult_count: int,
+                    search_queries: list[str] = None, output_format: str = 'text',
+                    ctx: Context = None) -> str:
+    """
+    Gather everything needed to plan a trip in one call: flights out to the
+    first destination and back from the last one, hotels in every destination
+    (dest_cities_str/dest_dates_str as in search_hotels) and a Google search
+    for each entry of search_queries. All parts run concurrently; each part
+    reports its time and, if it failed, its error. The hotels part is
+    'partial' when only some cities failed, and lists them. With
+    output_format='json' the flights part holds the search_flights JSON.
+    """
+    return await _async_plan_trip(orig_location_code, orig_date, dest_cities_str, dest_dates_str,
+                                  infant_count, child_count, adult_count,
+                                  search_queries=search_queries, output_format=output_format,
+                                  on_result=_progress_reporter(ctx))
+
+@mcp.tool
+async def create_trip_pdf(
     infants: int,
     children: int,
     adults: int,
@@ -57,8 +214,9 @@ def create_trip_pdf(
     flight: str,
     hotels: str,
     itinerary: str
-):
-    return _create_trip_pdf(
+) -> str:
+    """Render a PDF summary of the trip and return its download path."""
+    filename = await _async_create_trip_pdf(
         infants=infants,
         children=children,
         adults=adults,
@@ -72,14 +230,37 @@ def create_trip_pdf(
         hotels=hotels,
         itinerary=itinerary
     )
+    return f'/download/{filename}'
 
 app = mcp.http_app()
+_mcp_app_lifespan = app.router.lifespan_context
+
+@asynccontextmanager
+async def app_lifespan(app):
+    """Warm the browser pool and hotel directory when the worker boots; release shared clients on shutdown."""
+    async with _mcp_app_lifespan(app):
+        preload_hotel_directory()
+        await _start_amadeus_client()
+        await _warm_browser_pool()
+        try:
+            yield
+        finally:
+            await get_browser_pool().close()
+            await close_async_client()
+            shutdown_render_pool()
+            await asyncio.to_thread(get_tracer().flush)
+
+app.router.lifespan_context = app_lifespan
 
 async def download_file(request):
     filename = request.path_params['filename']
-    file_path = f'output/{filename}'
+    artifact = await artifact_store.aget(filename)
+    if artifact is not None:
+        return artifact_response(request, artifact, filename)
+
+    file_path = resolve_output_file(filename)
     
-    if not os.path.exists(file_path):
+    if file_path is None:
         return JSONResponse({"error": "File not found"}, status_code=404)
     
     return FileResponse(
@@ -91,8 +272,75 @@ async def download_file(request):
 download_route = Route('/download/{filename}', download_file, methods=['GET'])
 app.routes.append(download_route)
 
+async def stats(request):
+    return JSONResponse({
+        "google_search_phases": _search_phase_stats(),
+        "google_search_cache": _search_cache_stats(),
+        "flight_cache": _flight_cache_stats(),
+        "amadeus_scheduler": get_async_client().scheduler.stats(),
+        "pdf_artifacts": artifact_store_stats()
+    })
+
+stats_route = Route('/stats', stats, methods=['GET'])
+app.routes.append(stats_route)
+
+REGISTRY.add_collector(cache_collector({
+    'flight_offers': _flight_cache_stats,
+    'google_search': _search_cache_stats,
+    'pdf_artifacts': artifact_store_stats,
+}))
+REGISTRY.add_collector(scheduler_collector(lambda: get_async_client().scheduler.stats()))
+
+async def metrics(request):
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+metrics_route = Route('/metrics', metrics, methods=['GET'])
+app.routes.append(metrics_route)
+
+async def traces(request):
+    exporter = get_tracer().exporter
+    if not isinstance(exporter, MemoryExporter):
+        return JSONResponse({"error": "Traces are only kept in memory with TRACE_EXPORTER=memory"}, status_code=404)
+    return JSONResponse({"spans": exporter.spans(request.query_params.get('trace_id'))})
+
+traces_route = Route('/traces', traces, methods=['GET'])
+app.routes.append(traces_route)
+
 def main():
-    uvicorn.run(app, host='0.0.0.0', port=8000)
+    """
+    Serve the app; SERVER_WORKERS > 1 runs that many worker processes.
+
+    Each worker has its own event loop, browser pool and PDF render pool.
+    Caches, in-memory PDFs and the Amadeus token are shared through SQLite
+    and the token file, placed under cache/ unless configured. SIGHUP
+    replaces the workers one at a time (each new worker must be ready before
+    the old one stops); SIGINT/SIGTERM let in-flight calls finish for up to
+    SERVER_GRACEFUL_TIMEOUT seconds.
+    """
+    host = os.getenv('SERVER_HOST', '0.0.0.0')
+    port = int(os.getenv('SERVER_PORT', '8000'))
+    workers = int(os.getenv('SERVER_WORKERS', '1'))
+    graceful_timeout = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', '30'))
+    max_requests = int(os.getenv('SERVER_MAX_REQUESTS', '0'))
+    if workers <= 1:
+        uvicorn.run(app, host=host, port=port, timeout_graceful_shutdown=graceful_timeout,
+                    limit_max_requests=max_requests or None)
+        return
+
+    os.environ.setdefault('SHARED_CACHE_DB', 'cache/shared_cache.sqlite3')
+    os.environ.setdefault('AMADEUS_TOKEN_FILE', 'cache/amadeus_token.json')
+    os.makedirs(os.path.dirname(os.environ['AMADEUS_TOKEN_FILE']) or '.', exist_ok=True)
+    # Workers are spawned processes that re-import the parent's __main__; handing
+    # the process over to the uvicorn CLI keeps them from running this file twice.
+    command = [sys.executable, '-m', 'uvicorn', 'server:app', '--app-dir', os.path.dirname(os.path.abspath(__file__)),
+               '--host', host, '--port', str(port), '--workers', str(workers),
+               '--timeout-graceful-shutdown', str(graceful_timeout), '--log-level', LOG_LEVEL.lower()]
+    if max_requests:
+        command += ['--limit-max-requests', str(max_requests)]
+    logger.info("Starting %d workers on %s:%d", workers, host, port)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, command)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
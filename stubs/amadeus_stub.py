@@ -0,0 +1,253 @@
+"""
+Local stand-in for the Amadeus REST API.
+
+Serves deterministic, Amadeus-shaped responses for the endpoints the travel
+agent uses, so the server can be exercised without credentials or network:
+
+    python -m stubs.amadeus_stub --port 8081
+    AMADEUS_BASE_URL=http://127.0.0.1:8081 python server.py
+
+With --fixtures DIR, recorded responses (flight_offers.json, hotel_offers.json,
+see benchmarks/record_fixtures.py) are replayed instead of generated ones.
+"""
+from datetime import datetime, timedelta
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import time
+import uvicorn
+
+HUBS = ['NRT', 'ICN', 'SFO', 'FRA', 'DXB', 'SIN']
+CARRIERS = ['BR', 'CI', 'UA', 'JL', 'NH', 'CX']
+AIRCRAFT = ['77W', '359', '789', '321']
+
+_token_ids = itertools.count(1)
+
+
+def _seed(*parts) -> int:
+    return int(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()[:8], 16)
+
+
+async def _simulate_latency(request):
+    latency_ms = request.app.state.latency_ms
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+def _unauthorized(request):
+    if not request.headers.get('authorization', '').startswith('Bearer '):
+        return JSONResponse({'errors': [{'status': 401, 'title': 'Invalid access token'}]}, status_code=401)
+    return _rate_limited(request)
+
+
+def _rate_limited(request):
+    """Reject requests beyond the configured per-second quota, like Amadeus does."""
+    state = request.app.state
+    if not state.rate_limit:
+        return None
+    second = int(time.time())
+    if state.window[0] != second:
+        state.window = [second, 0]
+    state.window[1] += 1
+    if state.window[1] > state.rate_limit:
+        return JSONResponse({'errors': [{'status': 429, 'code': 38194, 'title': 'Too many requests'}]},
+                            status_code=429, headers={'Retry-After': '1'})
+    return None
+
+
+async def token(request):
+    await _simulate_latency(request)
+    return JSONResponse({
+        'type': 'amadeusOAuth2Token',
+        'access_token': f'stub-token-{next(_token_ids)}',
+        'token_type': 'Bearer',
+        'expires_in': 1799,
+        'state': 'approved',
+    })
+
+
+def _segment(origin, destination, departure, minutes, carrier, number, aircraft):
+    arrival = departure + timedelta(minutes=minutes)
+    return {
+        'departure': {'iataCode': origin, 'terminal': '1', 'at': departure.strftime('%Y-%m-%dT%H:%M:%S')},
+        'arrival': {'iataCode': destination, 'terminal': '2', 'at': arrival.strftime('%Y-%m-%dT%H:%M:%S')},
+        'carrierCode': carrier,
+        'number': str(number),
+        'aircraft': {'code': aircraft},
+        'duration': f'PT{minutes // 60}H{minutes % 60}M',
+        'numberOfStops': 0,
+    }
+
+
+def _itinerary(origin_destination, index):
+    origin = origin_destination['originLocationCode']
+    destination = origin_destination['destinationLocationCode']
+    date = origin_destination['departureDateTimeRange']['date']
+    seed = _seed(origin, destination, date, index)
+    carrier = CARRIERS[seed % len(CARRIERS)]
+    aircraft = AIRCRAFT[seed % len(AIRCRAFT)]
+    departure = datetime.fromisoformat(date) + timedelta(hours=6 + seed % 14, minutes=5 * (seed % 12))
+    if seed % 3 == 0:
+        minutes = 180 + seed % 600
+        segments = [_segment(origin, destination, departure, minutes, carrier, 100 + seed % 900, aircraft)]
+    else:
+        hub = HUBS[seed % len(HUBS)]
+        first = 120 + seed % 400
+        layover = 45 + seed % 240
+        second = 90 + (seed // 7) % 300
+        segments = [
+            _segment(origin, hub, departure, first, carrier, 100 + seed % 900, aircraft),
+            _segment(hub, destination, departure + timedelta(minutes=first + layover), second,
+                     carrier, 100 + (seed // 3) % 900, aircraft),
+        ]
+        minutes = first + layover + second
+    return {'duration': f'PT{minutes // 60}H{minutes % 60}M', 'segments': segments}
+
+
+async def flight_offers(request):
+    await _simulate_latency(request)
+    if (error := _unauthorized(request)) is not None:
+        return error
+    body = await request.json()
+    count = body.get('searchCriteria', {}).get('maxFlightOffers', 4)
+    recorded = request.app.state.fixtures.get('flight_offers')
+    if recorded is not None:
+        return JSONResponse({**recorded, 'data': recorded['data'][:count]})
+    travelers = body.get('travelers', [])
+    offers = []
+    for index in range(1, count + 1):
+        itineraries = [_itinerary(od, index) for od in body['originDestinations']]
+        price = 250 + sum(_seed(od['originLocationCode'], od['destinationLocationCode'],
+                                od['departureDateTimeRange']['date'], index) % 900
+                          for od in body['originDestinations'])
+        price *= max(1, len(travelers))
+        offers.append({
+            'type': 'flight-offer',
+            'id': str(index),
+            'source': 'GDS',
+            'lastTicketingDate': body['originDestinations'][0]['departureDateTimeRange']['date'],
+            'numberOfBookableSeats': 1 + index % 9,
+            'itineraries': itineraries,
+            'price': {'currency': body.get('currencyCode', 'USD'), 'total': f'{price:.2f}', 'base': f'{price * 0.8:.2f}'},
+            'travelerPricings': [{
+                'travelerId': traveler['id'],
+                'travelerType': traveler['travelerType'],
+                'fareDetailsBySegment': [{
+                    'segmentId': '1',
+                    'cabin': 'ECONOMY',
+                    'includedCheckedBags': {'quantity': index % 3},
+                    'includedCabinBags': {'quantity': 1},
+                }],
+            } for traveler in travelers],
+        })
+    return JSONResponse({'meta': {'count': len(offers)}, 'data': offers})
+
+
+async def hotels_by_city(request):
+    await _simulate_latency(request)
+    if (error := _unauthorized(request)) is not None:
+        return error
+    city_code = request.query_params.get('cityCode', 'XXX').upper()
+    hotels = [{
+        'chainCode': 'ST',
+        'iataCode': city_code,
+        'name': f'STUB HOTEL {city_code} {index}',
+        'hotelId': f'ST{city_code}{index:03d}',
+    } for index in range(1, 41)]
+    return JSONResponse({'data': hotels})
+
+
+async def hotel_offers(request):
+    await _simulate_latency(request)
+    if (error := _unauthorized(request)) is not None:
+        return error
+    recorded = request.app.state.fixtures.get('hotel_offers')
+    if recorded is not None:
+        return JSONResponse(recorded)
+    params = request.query_params
+    check_in = params.get('checkInDate')
+    check_out = params.get('checkOutDate')
+    adults = int(params.get('adults', 1))
+    nights = max(1, (datetime.fromisoformat(check_out) - datetime.fromisoformat(check_in)).days)
+    data = []
+    for hotel_id in params.get('hotelIds', '').split(','):
+        seed = _seed(hotel_id, check_in)
+        # Roughly a third of the listed hotels have no availability
+        if seed % 3 == 0:
+            continue
+        nightly = 80 + seed % 320
+        data.append({
+            'type': 'hotel-offers',
+            'hotel': {'hotelId': hotel_id, 'name': f'STUB HOTEL {hotel_id}', 'cityCode': hotel_id[2:5]},
+            'available': True,
+            'offers': [{
+                'id': f'OFFER{seed}',
+                'checkInDate': check_in,
+                'checkOutDate': check_out,
+                'room': {
+                    'typeEstimated': {'category': 'STANDARD_ROOM', 'beds': 1 + seed % 2, 'bedType': 'KING'},
+                    'description': {'text': f'Standard room, {250 + seed % 200}sqft/{23 + seed % 18}sqm, free wifi'},
+                },
+                'guests': {'adults': adults},
+                'price': {
+                    'currency': 'USD',
+                    'base': f'{nightly * nights:.2f}',
+                    'total': f'{nightly * nights * 1.12:.2f}',
+                    'variations': {'average': {'base': f'{nightly:.2f}'}},
+                },
+                'policies': {
+                    'cancellations': [{'deadline': f'{check_in}T23:59:00-04:00'}],
+                    'refundable': {'cancellationRefund': 'REFUNDABLE_UP_TO_DEADLINE'},
+                },
+            }],
+        })
+    return JSONResponse({'data': data})
+
+
+def load_fixtures(directory: str) -> dict:
+    """Recorded response documents in `directory`, keyed by endpoint name."""
+    fixtures = {}
+    for name in ('flight_offers', 'hotel_offers'):
+        path = os.path.join(directory, f'{name}.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                fixtures[name] = json.load(f)
+    return fixtures
+
+
+def create_app(latency_ms: float = 0, rate_limit: int = 0, fixtures: str = None) -> Starlette:
+    app = Starlette(routes=[
+        Route('/v1/security/oauth2/token', token, methods=['POST']),
+        Route('/v2/shopping/flight-offers', flight_offers, methods=['POST']),
+        Route('/v1/reference-data/locations/hotels/by-city', hotels_by_city, methods=['GET']),
+        Route('/v3/shopping/hotel-offers', hotel_offers, methods=['GET']),
+    ])
+    app.state.latency_ms = latency_ms
+    app.state.rate_limit = rate_limit
+    app.state.window = [0, 0]
+    app.state.fixtures = load_fixtures(fixtures) if fixtures else {}
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=float(os.getenv('STUB_LATENCY_MS', '0')),
+                        help='artificial delay added to every response')
+    parser.add_argument('--rate-limit', type=int, default=int(os.getenv('STUB_RATE_LIMIT', '0')),
+                        help='API requests per second before answering 429 (0 = unlimited)')
+    parser.add_argument('--fixtures', default=os.getenv('STUB_FIXTURES'),
+                        help='directory of recorded responses to replay')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.rate_limit, args.fixtures), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Local stand-in for the Google search results page.
+
+Serves a recorded results page (benchmarks/fixtures/serp.html by default) for
+every query, so google_search can run against a headless browser without
+network access or CAPTCHAs:
+
+    python -m stubs.google_stub --port 8082
+    GOOGLE_SEARCH_BASE_URL=http://127.0.0.1:8082 python server.py
+
+The fixture's `{query}` placeholder is replaced with the HTML-escaped query.
+"""
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse
+from starlette.routing import Route
+import argparse
+import asyncio
+import html
+import os
+import uvicorn
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'benchmarks', 'fixtures', 'serp.html')
+
+HOMEPAGE = '<!DOCTYPE html><html><head><title>Google</title></head><body><form action="/search"><input name="q"></form></body></html>'
+
+
+async def _simulate_latency(request):
+    latency_ms = request.app.state.latency_ms
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+async def homepage(request):
+    await _simulate_latency(request)
+    return HTMLResponse(HOMEPAGE)
+
+
+async def search(request):
+    await _simulate_latency(request)
+    query = html.escape(request.query_params.get('q', ''))
+    return HTMLResponse(request.app.state.page.replace('{query}', query))
+
+
+def create_app(fixture: str = DEFAULT_FIXTURE, latency_ms: float = 0) -> Starlette:
+    app = Starlette(routes=[
+        Route('/', homepage, methods=['GET']),
+        Route('/search', search, methods=['GET']),
+    ])
+    with open(fixture, encoding='utf-8') as f:
+        app.state.page = f.read()
+    app.state.latency_ms = latency_ms
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--fixture', default=os.getenv('STUB_SERP_FIXTURE', DEFAULT_FIXTURE),
+                        help='HTML results page to serve')
+    parser.add_argument('--latency-ms', type=float, default=float(os.getenv('STUB_LATENCY_MS', '0')),
+                        help='artificial delay added to every response')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.fixture, args.latency_ms), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from tools.cache import TTLCache
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class Loader:
+    """Async loader that counts its calls and can be held open until released."""
+
+    def __init__(self, value='value', error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        if self.release is None:
+            self.release = asyncio.Event()
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+async def _settle():
+    # Let scheduled tasks reach their first await
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_loads_coalesce():
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        loader = Loader()
+        callers = [asyncio.create_task(cache.get_or_load('key', loader)) for _ in range(5)]
+        await _settle()
+        loader.release.set()
+        return cache, loader, await asyncio.gather(*callers)
+
+    cache, loader, results = run(scenario())
+    assert results == ['value'] * 5
+    assert loader.calls == 1
+    assert cache.stats()['coalesced'] == 4
+    assert cache.get('key') == 'value'
+
+
+def test_cancelled_leader_lets_followers_retry():
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        loader = Loader()
+        leader = asyncio.create_task(cache.get_or_load('key', loader))
+        await _settle()
+        followers = [asyncio.create_task(cache.get_or_load('key', loader)) for _ in range(3)]
+        await _settle()
+        leader.cancel()
+        await _settle()
+        loader.release.set()
+        results = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return loader, results
+
+    loader, results = run(scenario())
+    assert results == ['value'] * 3
+    # The cancelled load and one retry shared by every follower
+    assert loader.calls == 2
+
+
+def test_stale_hit_schedules_one_revalidation():
+    async def scenario():
+        cache = TTLCache(ttl=0.05, stale_ttl=60)
+        cache.set('key', 'old')
+        await asyncio.sleep(0.1)
+        loader = Loader('new')
+        stale = [await cache.get_or_load('key', loader) for _ in range(3)]
+        await _settle()
+        loader.release.set()
+        await asyncio.gather(*cache._tasks)
+        return cache, loader, stale
+
+    cache, loader, stale = run(scenario())
+    assert stale == ['old'] * 3
+    assert loader.calls == 1
+    assert cache.stats()['stale_hits'] == 3
+    assert cache.get('key') == 'new'
+
+
+def test_failed_load_is_not_cached():
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        failing = Loader(error=RuntimeError('upstream down'))
+        failing.release = asyncio.Event()
+        failing.release.set()
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load('key', failing)
+        rejected = Loader('error text')
+        rejected.release = asyncio.Event()
+        rejected.release.set()
+        first = await cache.get_or_load('key', rejected, should_cache=lambda value: value != 'error text')
+        second = await cache.get_or_load('key', rejected, should_cache=lambda value: value != 'error text')
+        return cache, failing, rejected, (first, second)
+
+    cache, failing, rejected, results = run(scenario())
+    assert failing.calls == 1
+    assert results == ('error text', 'error text')
+    assert rejected.calls == 2
+    assert cache.get('key') is None
+
+
+def test_sqlite_store_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    writer = TTLCache(ttl=60, sqlite_path=path, namespace='shared')
+    reader = TTLCache(ttl=60, sqlite_path=path, namespace='shared')
+    other = TTLCache(ttl=60, sqlite_path=path, namespace='other')
+
+    async def scenario():
+        await writer.aset('key', {'offers': [1, 2]})
+        return await reader.aget('key'), await other.aget('key')
+
+    assert run(scenario()) == ({'offers': [1, 2]}, None)
+    assert reader.stats()['hits'] == 1
+
+
+def test_sqlite_store_is_bounded(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = TTLCache(maxsize=3, ttl=60, sqlite_path=path, namespace='bounded')
+    for i in range(10):
+        cache._next_purge = 0
+        cache.set(f'key{i}', i)
+    reader = TTLCache(ttl=60, sqlite_path=path, namespace='bounded')
+    assert [reader.get(f'key{i}') for i in range(10)] == [None] * 7 + [7, 8, 9]
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process token sharing
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Shortest wait between background refreshes, however soon the token expires
+MIN_REFRESH_INTERVAL = 30
+
+
+class TokenManager:
+    """
+    Caches the Amadeus OAuth access token and renews it before it expires.
+
+    Once `start()` has run, a background task refreshes the token
+    `refresh_margin` seconds ahead of expiry, so requests never wait on the
+    token endpoint. When `token_file` is set, worker processes share one token
+    through that file, serialized with an exclusive file lock, so only one of
+    them calls the token endpoint per refresh.
+
+    Args:
+        fetch: Coroutine function returning the token endpoint's JSON document
+        cache_key: Identifies the credentials/host the token belongs to
+        refresh_margin: Seconds before expiry at which the token is renewed
+        token_file: Optional path of the shared token file
+    """
+
+    def __init__(self, fetch, cache_key: str, refresh_margin: float = 300, token_file: str = None):
+        self._fetch = fetch
+        self._cache_key = hashlib.sha256(cache_key.encode('utf-8')).hexdigest()
+        self.refresh_margin = refresh_margin
+        self.token_file = token_file if fcntl else None
+        self._token = None
+        self._expires_at = 0
+        self._rejected = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def get_token(self) -> str:
+        """Return a valid token, fetching one inline only if none is cached."""
+        # A token inside the refresh margin is still valid; the background task is renewing it
+        if self._token and time.time() < self._expires_at - 30:
+            return self._token
+        async with self._lock:
+            if self._token and time.time() < self._expires_at - 30:
+                return self._token
+            await self._refresh()
+            return self._token
+
+    def invalidate(self, token: str):
+        """Drop `token` after the API rejected it, unless it was already replaced."""
+        self._rejected = token
+        if self._token == token:
+            self._token, self._expires_at = None, 0
+
+    async def start(self):
+        """Fetch a token now and keep it fresh in the background."""
+        await self.get_token()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        failures = 0
+        while True:
+            await asyncio.sleep(max(MIN_REFRESH_INTERVAL, self._expires_at - self.refresh_margin - time.time()))
+            try:
+                async with self._lock:
+                    if time.time() >= self._expires_at - self.refresh_margin:
+                        await self._refresh()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.warning("Amadeus token refresh failed (%d): %s", failures, e)
+                await asyncio.sleep(min(60, 2 ** failures))
+
+    async def _refresh(self):
+        if not self.token_file:
+            self._adopt(await self._fetch_token())
+            return
+        handle = await asyncio.to_thread(self._lock_file)
+        try:
+            shared = self._read_shared(handle)
+            if (shared and shared['access_token'] != self._rejected
+                    and shared['expires_at'] - self.refresh_margin > time.time()):
+                # Another worker renewed it already
+                self._adopt(shared)
+                return
+            token = await self._fetch_token()
+            self._adopt(token)
+            self._write_shared(handle, token)
+        finally:
+            await asyncio.to_thread(self._unlock_file, handle)
+
+    async def _fetch_token(self):
+        document = await self._fetch()
+        try:
+            expires_in = int(document['expires_in'])
+        except (KeyError, TypeError, ValueError):
+            expires_in = 0
+        if expires_in <= 0:
+            raise ValueError(f"Token response has no valid expires_in: {document.get('expires_in')!r}")
+        logger.info("Fetched Amadeus access token (expires in %ss)", expires_in)
+        return {
+            'access_token': document['access_token'],
+            'expires_at': time.time() + expires_in,
+        }
+
+    def _adopt(self, token):
+        self._token, self._expires_at = token['access_token'], token['expires_at']
+
+    def _lock_file(self):
+        fd = os.open(self.token_file, os.O_RDWR | os.O_CREAT, 0o600)
+        handle = os.fdopen(fd, 'r+', encoding='utf-8')
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _unlock_file(self, handle):
+        try:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            handle.close()
+
+    def _read_shared(self, handle):
+        handle.seek(0)
+        try:
+            shared = json.loads(handle.read() or 'null')
+        except ValueError:
+            return None
+        if not shared or shared.get('key') != self._cache_key:
+            return None
+        return shared
+
+    def _write_shared(self, handle, token):
+        handle.seek(0)
+        handle.truncate()
+        json.dump({'key': self._cache_key, **token}, handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+__all__ = ["TokenManager"]
@@ -0,0 +1,216 @@
+from amadeus import Client
+from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import os
+import time
+import httpx
+from tools.amadeus_auth import TokenManager
+from tools.amadeus_scheduler import Priority, RequestScheduler, retry_after_seconds
+from tools.metrics import AMADEUS_IN_FLIGHT, AMADEUS_LATENCY
+from tools.retry import backoff_delay
+from tools.tracing import span
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+AMADEUS_HOSTS = {
+    'test': 'https://test.api.amadeus.com',
+    'production': 'https://api.amadeus.com',
+}
+
+
+class AmadeusAPIError(Exception):
+    """Error response from the Amadeus REST API."""
+
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        self.status_code = response.status_code
+        self.body = response.text
+        super().__init__(f"[{self.status_code}] {self.body[:500]}")
+
+
+class AsyncAmadeusClient:
+    """
+    Async Amadeus client sharing one pooled keep-alive HTTP connection set.
+
+    Credentials and host follow the amadeus SDK conventions (AMADEUS_CLIENT_ID,
+    AMADEUS_CLIENT_SECRET, AMADEUS_HOSTNAME); AMADEUS_BASE_URL overrides the
+    host, e.g. to point at the local stub server in stubs/amadeus_stub.py.
+    Access tokens are handled by a TokenManager, and every API request is
+    paced by a RequestScheduler so bursts queue instead of failing with 429.
+
+    Args:
+        max_connections: Size of the HTTP connection pool
+        max_concurrency: Maximum number of requests in flight at once
+        timeout: Per-request timeout in seconds
+        token_file: Optional file through which worker processes share the access token
+        scheduler: Rate-limit scheduler; defaults to one configured from the environment
+    """
+
+    def __init__(self, client_id: str = None, client_secret: str = None, base_url: str = None,
+                 max_connections: int = 20, max_concurrency: int = 10, timeout: float = 30,
+                 token_file: str = None, scheduler: RequestScheduler = None):
+        self.client_id = client_id or os.getenv('AMADEUS_CLIENT_ID')
+        self.client_secret = client_secret or os.getenv('AMADEUS_CLIENT_SECRET')
+        self.base_url = (base_url or os.getenv('AMADEUS_BASE_URL')
+                         or AMADEUS_HOSTS[os.getenv('AMADEUS_HOSTNAME', 'test')])
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._http = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.scheduler = scheduler or RequestScheduler.from_env()
+        self.tokens = TokenManager(
+            self._request_token,
+            cache_key=f'{self.base_url}|{self.client_id}',
+            token_file=token_file
+        )
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_connections=int(os.getenv('AMADEUS_MAX_CONNECTIONS', '20')),
+            max_concurrency=int(os.getenv('AMADEUS_MAX_CONCURRENCY', '10')),
+            timeout=float(os.getenv('AMADEUS_TIMEOUT', '30')),
+            token_file=os.getenv('AMADEUS_TOKEN_FILE') or None
+        )
+
+    async def start(self):
+        """Acquire an access token up front and keep it refreshed in the background."""
+        await self.tokens.start()
+
+    async def get(self, path: str, priority: Priority = Priority.HOTEL_OFFERS, **params):
+        """GET `path` and return the response's `data` member."""
+        return (await self.request('GET', path, params=params, priority=priority))['data']
+
+    async def post(self, path: str, body: dict, priority: Priority = Priority.FLIGHTS):
+        """POST a JSON body to `path` and return the response's `data` member."""
+        return (await self.request('POST', path, body=body, priority=priority))['data']
+
+    async def request(self, method: str, path: str, params: dict = None, body: dict = None,
+                      priority: Priority = Priority.HOTEL_OFFERS):
+        """
+        Send an authenticated request and return the decoded JSON document.
+
+        The request waits for a scheduler slot of the given priority. 429
+        responses are retried after the server's Retry-After delay (or jittered
+        backoff) until the scheduler's queue deadline.
+        """
+        headers = {}
+        content = None
+        if body is not None:
+            headers['Content-Type'] = 'application/vnd.amadeus+json'
+            content = json.dumps(body)
+        deadline = self.scheduler.deadline()
+        attempt = 0
+        with span('amadeus.request', method=method, path=path, priority=priority.name) as request_span:
+            while True:
+                with span('amadeus.schedule'):
+                    await self.scheduler.acquire(priority, deadline)
+                with span('amadeus.http') as http_span:
+                    response = await self._send(method, path, params, content, headers)
+                    http_span.set_attribute('status', response.status_code)
+                if response.status_code != 429:
+                    break
+                attempt += 1
+                delay = retry_after_seconds(response.headers.get('Retry-After'))
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                self.scheduler.throttled(delay)
+                if time.monotonic() + delay >= deadline:
+                    break
+            request_span.set_attribute('status', response.status_code)
+            request_span.set_attribute('throttled', attempt)
+            if response.status_code >= 400:
+                raise AmadeusAPIError(response)
+            with span('amadeus.decode'):
+                return response.json()
+
+    async def _send(self, method, path, params, content, headers):
+        async with self._semaphore:
+            for attempt in range(2):
+                token = await self.tokens.get_token()
+                headers['Authorization'] = f'Bearer {token}'
+                start = time.perf_counter()
+                with AMADEUS_IN_FLIGHT.track_inprogress():
+                    response = await self._client().request(method, path, params=params, content=content,
+                                                            headers=headers)
+                AMADEUS_LATENCY.observe(time.perf_counter() - start, method=method, path=path,
+                                        status=response.status_code)
+                if response.status_code == 401 and attempt == 0:
+                    # Token revoked or expired early; fetch a new one and retry once
+                    self.tokens.invalidate(token)
+                    continue
+                return response
+
+    async def aclose(self):
+        await self.tokens.stop()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _client(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60
+                ),
+                timeout=self.timeout
+            )
+        return self._http
+
+    async def _request_token(self):
+        response = await self._client().post('/v1/security/oauth2/token', data={
+            'grant_type': 'client_credentials',
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+        })
+        if response.status_code >= 400:
+            raise AmadeusAPIError(response)
+        return response.json()
+
+
+_client = None
+_sync_client = None
+
+
+def get_sync_client() -> Client:
+    """
+    Return the process-wide amadeus SDK client used by the blocking code paths,
+    so every tool module shares one SDK token.
+    """
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = Client()
+    return _sync_client
+
+
+def get_async_client() -> AsyncAmadeusClient:
+    """Return the process-wide async Amadeus client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = AsyncAmadeusClient.from_env()
+    return _client
+
+
+async def close_async_client():
+    """Close the process-wide client; the next `get_async_client()` starts a new one."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+__all__ = ["AsyncAmadeusClient", "AmadeusAPIError", "get_async_client", "close_async_client", "get_sync_client"]
@@ -0,0 +1,161 @@
+from amadeus import ResponseError
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from tools.retry import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Request classes; lower values are dispatched first when the quota is saturated."""
+    FLIGHTS = 0
+    HOTEL_OFFERS = 1
+    HOTEL_LIST = 2
+
+
+class DeadlineExceeded(TimeoutError):
+    """A request could not be sent within its queueing deadline."""
+
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    Token-bucket scheduler shared by all Amadeus requests of a process.
+
+    Callers `await acquire(priority)` before each request. Slots are granted at
+    `rate` per second (with bursts up to `burst`), highest priority first, and
+    FIFO within a priority. A waiter that is not granted a slot before its
+    deadline gets DeadlineExceeded. After a 429, `throttled()` pauses the whole
+    bucket for the server-requested delay so queued requests stop hammering
+    the quota.
+
+    Args:
+        rate: Sustained requests per second
+        burst: Bucket capacity; defaults to one second's worth of requests
+        max_queue_wait: Default seconds a request may wait for a slot
+    """
+
+    def __init__(self, rate: float = 10, burst: float = None, max_queue_wait: float = 20):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.max_queue_wait = max_queue_wait
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._dispatcher = None
+        self.granted = 0
+        self.throttled_responses = 0
+        self.deadline_exceeded = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rate=float(os.getenv('AMADEUS_RATE_LIMIT', '10')),
+            burst=float(os.getenv('AMADEUS_RATE_BURST', '0')) or None,
+            max_queue_wait=float(os.getenv('AMADEUS_QUEUE_DEADLINE', '20'))
+        )
+
+    def deadline(self) -> float:
+        """Default monotonic deadline for a request starting now."""
+        return time.monotonic() + self.max_queue_wait
+
+    async def acquire(self, priority: Priority = Priority.HOTEL_OFFERS, deadline: float = None):
+        """Wait for a request slot; raises DeadlineExceeded if none is granted by `deadline`."""
+        deadline = deadline or self.deadline()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        try:
+            await asyncio.wait_for(future, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded(f"No Amadeus request slot within the queue deadline ({priority.name})") from None
+
+    def throttled(self, delay: float):
+        """Record a 429 and pause dispatching for `delay` seconds."""
+        self.throttled_responses += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        # Do not release a burst as soon as the pause ends: the bucket refills from the end of the pause
+        self._tokens = 0
+        self._updated = self._paused_until
+        logger.warning("Amadeus rate limit hit; pausing requests for %.1fs", delay)
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'queued': sum(1 for *_, future in self._waiters if not future.done()),
+            'granted': self.granted,
+            'throttled_responses': self.throttled_responses,
+            'deadline_exceeded': self.deadline_exceeded,
+        }
+
+    async def _dispatch(self):
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            *_, future = heapq.heappop(self._waiters)
+            # Skip waiters that timed out or were cancelled
+            if future.done():
+                continue
+            self._tokens -= 1
+            self.granted += 1
+            future.set_result(None)
+
+
+def call_with_rate_limit_retry(fn, max_wait: float = 20):
+    """
+    Call a blocking amadeus SDK function, retrying 429 responses with
+    Retry-After-aware backoff for up to `max_wait` seconds.
+    """
+    deadline = time.monotonic() + max_wait
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except ResponseError as error:
+            response = getattr(error, 'response', None)
+            if getattr(response, 'status_code', None) != 429:
+                raise
+            attempt += 1
+            # The SDK Response wraps the urllib response, which carries the headers
+            headers = getattr(getattr(response, 'http_response', None), 'headers', None) or {}
+            delay = retry_after_seconds(headers.get('Retry-After'))
+            if delay is None:
+                delay = backoff_delay(attempt)
+            if time.monotonic() + delay >= deadline:
+                raise
+            logger.warning("Amadeus rate limit hit; retrying in %.1fs", delay)
+            time.sleep(delay)
+
+
+__all__ = ["Priority", "RequestScheduler", "DeadlineExceeded", "call_with_rate_limit_retry"]
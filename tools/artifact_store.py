@@ -0,0 +1,111 @@
+from collections import namedtuple
+from starlette.responses import Response
+import hashlib
+import json
+import os
+import re
+from tools.cache import Codec, TTLCache
+
+Artifact = namedtuple('Artifact', ['data', 'etag', 'media_type'])
+
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+def make_artifact(data: bytes, media_type: str = 'application/pdf') -> Artifact:
+    """Wrap rendered bytes with a strong ETag derived from their content."""
+    return Artifact(data, f'"{hashlib.sha256(data).hexdigest()[:32]}"', media_type)
+
+
+def _dump_artifact(artifact: Artifact) -> bytes:
+    header = json.dumps({'etag': artifact.etag, 'media_type': artifact.media_type})
+    return header.encode('utf-8') + b'\n' + artifact.data
+
+
+def _load_artifact(blob: bytes) -> Artifact:
+    header, _, data = blob.partition(b'\n')
+    header = json.loads(header)
+    return Artifact(data, header['etag'], header['media_type'])
+
+
+# Stored as a JSON header line followed by the raw bytes
+ARTIFACT_CODEC = Codec(_dump_artifact, _load_artifact)
+
+# Bounded by count and by total size; entries expire after PDF_STORE_TTL seconds.
+# With SHARED_CACHE_DB every server worker can serve every stored PDF.
+artifact_store = TTLCache(
+    maxsize=int(os.getenv('PDF_STORE_SIZE', '128')),
+    ttl=float(os.getenv('PDF_STORE_TTL', '3600')),
+    sqlite_path=os.getenv('SHARED_CACHE_DB') or None,
+    namespace='artifacts',
+    max_bytes=int(os.getenv('PDF_STORE_MAX_BYTES', str(64 * 1024 * 1024))),
+    weigher=lambda artifact: len(artifact.data),
+    codec=ARTIFACT_CODEC
+)
+
+
+def artifact_store_stats():
+    return artifact_store.stats()
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in header.split(',')]
+    # Weak comparison, as required for If-None-Match
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def parse_range(header: str, size: int):
+    """
+    Parse a single-range `Range: bytes=...` header.
+
+    Returns:
+        (start, end) inclusive, None to ignore the header and send the whole
+        body (malformed or multi-range requests), or False if unsatisfiable.
+    """
+    match = _RANGE_RE.fullmatch(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the final `last` bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def artifact_response(request, artifact: Artifact, filename: str) -> Response:
+    """
+    Serve an in-memory artifact with ETag, conditional GET and byte-range support.
+    """
+    size = len(artifact.data)
+    headers = {
+        'ETag': artifact.etag,
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    }
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and _etag_matches(if_none_match, artifact.etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or if_range.strip() == artifact.etag):
+        byte_range = parse_range(range_header, size)
+        if byte_range is False:
+            headers['Content-Range'] = f'bytes */{size}'
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            return Response(artifact.data[start:end + 1], status_code=206,
+                            media_type=artifact.media_type, headers=headers)
+
+    return Response(artifact.data, media_type=artifact.media_type, headers=headers)
+
+
+__all__ = ["Artifact", "ARTIFACT_CODEC", "make_artifact", "artifact_store", "artifact_store_stats", "artifact_response", "parse_range"]
@@ -0,0 +1,165 @@
+from playwright.async_api import async_playwright
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-blink-features=AutomationControlled',
+    '--disable-web-security',
+    f'--user-agent={USER_AGENT}'
+]
+
+# Anti-detection script, installed once per context instead of once per page
+STEALTH_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined,
+    });
+    delete navigator.webdriver;
+"""
+
+
+class _PooledBrowser:
+    """A launched Chromium instance plus the context its pages are opened in."""
+
+    def __init__(self):
+        self.browser = None
+        self.context = None
+        self.pages_served = 0
+
+    def healthy(self):
+        return self.browser is not None and self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Process-wide pool of warm headless Chromium browsers.
+
+    Each slot keeps one browser and one reusable context alive. Callers borrow
+    a fresh page from an idle slot via `page()`; the slot is relaunched when
+    its browser has disconnected or after it has served `max_pages` pages.
+
+    Playwright objects are bound to the event loop that started them, so a
+    pool must only be used from the loop it was started on.
+    """
+
+    def __init__(self, size: int = 2, max_pages: int = 50):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self._playwright = None
+        self._idle = None
+        self._slots = []
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            size=int(os.getenv('BROWSER_POOL_SIZE', '2')),
+            max_pages=int(os.getenv('BROWSER_POOL_MAX_PAGES', '50'))
+        )
+
+    @property
+    def started(self):
+        return self._playwright is not None
+
+    async def start(self):
+        """Launch the pool's browsers. Safe to call repeatedly."""
+        async with self._lock:
+            if self.started:
+                return
+            playwright = await async_playwright().start()
+            idle = asyncio.Queue()
+            slots = []
+            try:
+                for _ in range(self.size):
+                    slot = _PooledBrowser()
+                    await self._launch(slot, playwright)
+                    slots.append(slot)
+                    idle.put_nowait(slot)
+            except Exception:
+                for slot in slots:
+                    await self._shutdown(slot)
+                await playwright.stop()
+                raise
+            self._playwright, self._idle, self._slots = playwright, idle, slots
+            logger.info("Browser pool started with %d browser(s)", self.size)
+
+    async def close(self):
+        """Close every browser and stop Playwright."""
+        async with self._lock:
+            if not self.started:
+                return
+            for slot in self._slots:
+                await self._shutdown(slot)
+            await self._playwright.stop()
+            self._playwright, self._idle, self._slots = None, None, []
+            logger.info("Browser pool closed")
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a new page from a healthy browser, closing it on exit."""
+        if not self.started:
+            await self.start()
+        # Keep the queue we borrowed from: close() drops it while pages may still be in use
+        idle = self._idle
+        slot = await idle.get()
+        try:
+            if not slot.healthy() or slot.pages_served >= self.max_pages:
+                await self._recycle(slot)
+            slot.pages_served += 1
+            page = await slot.context.new_page()
+            try:
+                yield page
+            finally:
+                try:
+                    await page.close()
+                except Exception as e:
+                    logger.warning("Failed to close page: %s", e)
+        finally:
+            # A closed (or restarted) pool has already shut this slot's browser down
+            if self._idle is idle:
+                idle.put_nowait(slot)
+
+    async def _launch(self, slot, playwright=None):
+        playwright = playwright or self._playwright
+        slot.browser = await playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        slot.context = await slot.browser.new_context(
+            viewport={'width': 1920, 'height': 1080},
+            user_agent=USER_AGENT
+        )
+        await slot.context.add_init_script(STEALTH_SCRIPT)
+        slot.pages_served = 0
+
+    async def _recycle(self, slot):
+        logger.info("Recycling browser after %d page(s) (healthy=%s)", slot.pages_served, slot.healthy())
+        await self._shutdown(slot)
+        # If the relaunch fails the slot stays unhealthy and is retried on next use
+        await self._launch(slot)
+
+    async def _shutdown(self, slot):
+        if slot.browser is not None:
+            try:
+                await slot.browser.close()
+            except Exception as e:
+                logger.warning("Failed to close browser: %s", e)
+        slot.browser, slot.context = None, None
+
+
+_pool = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Return the process-wide browser pool, creating it from the environment on first use."""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool.from_env()
+    return _pool
+
+
+__all__ = ["BrowserPool", "get_browser_pool"]
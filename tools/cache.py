@@ -0,0 +1,431 @@
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class _LoaderCancelled(Exception):
+    """Set on a shared load whose leader was cancelled; followers retry instead of failing."""
+
+
+# How a cache serializes values for its SQLite store
+Codec = namedtuple('Codec', ['dumps', 'loads'])
+JSON_CODEC = Codec(json.dumps, json.loads)
+
+# Seconds between sweeps of expired rows from a cache's SQLite store
+PURGE_INTERVAL = 60
+
+
+class SQLiteStore:
+    """
+    Optional on-disk backing store for TTLCache.
+
+    Values are stored as JSON unless another `codec` is given. Several caches,
+    also in different processes, can share one database file by using
+    different namespaces. Calls block on disk and on other processes' write
+    locks, so async code runs them on a worker thread.
+    """
+
+    def __init__(self, path: str, namespace: str, codec: Codec = JSON_CODEC):
+        self.namespace = namespace
+        self.codec = codec
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))'
+            )
+
+    def get(self, key: str, grace: float = 0):
+        """Return (expires_at, value), or None when absent or expired for more than `grace` seconds."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT expires_at, value FROM cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+        if row is None or row[0] + grace <= time.time():
+            return None
+        return row[0], self.codec.loads(row[1])
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.namespace, key, self.codec.dumps(value), expires_at)
+            )
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+    def purge_expired(self, grace: float = 0, max_rows: int = None, max_bytes: int = None):
+        """
+        Delete rows expired for more than `grace` seconds, then the least
+        recently written rows beyond `max_rows` rows or `max_bytes` of values.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM cache WHERE namespace = ? AND expires_at + ? <= ?',
+                (self.namespace, grace, time.time())
+            )
+            # INSERT OR REPLACE assigns a new rowid, so rowid order is write order
+            if max_rows:
+                self._conn.execute(
+                    'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE namespace = ? '
+                    'ORDER BY rowid DESC LIMIT -1 OFFSET ?)',
+                    (self.namespace, max_rows)
+                )
+            if max_bytes:
+                self._conn.execute(
+                    'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM ('
+                    'SELECT rowid, SUM(length(value)) OVER (ORDER BY rowid DESC) AS total '
+                    'FROM cache WHERE namespace = ?) WHERE total > ?)',
+                    (self.namespace, max_bytes)
+                )
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with per-entry TTL and LRU eviction.
+
+    Args:
+        maxsize: Maximum number of entries kept in memory
+        ttl: Default time-to-live in seconds; 0 disables caching
+        sqlite_path: Optional SQLite file used as a write-through backing store;
+            processes using the same file and namespace share entries. The
+            store is bounded by `maxsize` and `max_bytes` too, enforced when
+            expired rows are swept (every PURGE_INTERVAL seconds)
+        namespace: Key namespace inside the SQLite file
+        codec: Serialization of values in the SQLite file (default JSON)
+        stale_ttl: Seconds an expired entry may still be served while it is
+            refreshed in the background (stale-while-revalidate); 0 disables it
+        max_bytes: Optional cap on the summed `weigher(value)` of all entries
+        weigher: Callable estimating an entry's size in bytes, used with `max_bytes`
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600, sqlite_path: str = None, namespace: str = 'default',
+                 stale_ttl: float = 0, max_bytes: int = None, weigher=None, codec: Codec = JSON_CODEC):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self._weigher = weigher if max_bytes else None
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._sync_inflight = {}
+        self._refreshing = set()
+        self._tasks = set()
+        self._store = SQLiteStore(sqlite_path, namespace, codec) if sqlite_path else None
+        self._next_purge = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key, default=None):
+        """Return the fresh cached value for `key`, or `default` when absent or expired."""
+        found = self._lookup(key, allow_stale=False)
+        return default if found is _MISSING else found[0]
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = self._expiry(ttl)
+        if expires_at is None:
+            return
+        self._remember(key, value, expires_at)
+        if self._store:
+            self._write_store(key, value, expires_at)
+
+    async def aget(self, key, default=None):
+        """`get` for the event loop: SQLite store reads run on a worker thread."""
+        found = await self._alookup(key, allow_stale=False)
+        return default if found is _MISSING else found[0]
+
+    async def aset(self, key, value, ttl: float = None):
+        """`set` for the event loop: the SQLite store write runs on a worker thread."""
+        expires_at = self._expiry(ttl)
+        if expires_at is None:
+            return
+        self._remember(key, value, expires_at)
+        if self._store:
+            await asyncio.to_thread(self._write_store, key, value, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._forget(key)
+        if self._store:
+            self._store.delete(key)
+
+    async def get_or_load(self, key, loader, should_cache=None):
+        """
+        Return the cached value for `key`, awaiting `loader()` on a miss.
+
+        Concurrent callers missing on the same key share a single `loader()`
+        call (single-flight). Results are only stored when `should_cache(value)`
+        is true, so callers can keep error results out of the cache. A stale
+        entry is returned immediately and reloaded in a background task.
+        """
+        if not self.enabled:
+            return await loader()
+
+        found = await self._alookup(key, allow_stale=True)
+        if found is not _MISSING:
+            value, fresh = found
+            if not fresh:
+                self._revalidate_in_task(key, loader, should_cache)
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            with self._lock:
+                self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _LoaderCancelled:
+                # The caller that was loading went away; this one was not cancelled, so load again
+                return await self.get_or_load(key, loader, should_cache)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.set_exception(_LoaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited future does not log a warning
+            future.exception()
+            raise
+        else:
+            # Followers need not wait for the store write
+            future.set_result(value)
+            await self._astore_result(key, value, should_cache)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        """
+        Blocking counterpart of `get_or_load` for code running in worker threads.
+
+        Threads missing on the same key wait for a single `compute()` call; a
+        stale entry is returned immediately and recomputed on a background thread.
+        """
+        if not self.enabled:
+            return compute()
+
+        found = self._lookup(key, allow_stale=True)
+        if found is not _MISSING:
+            value, fresh = found
+            if not fresh:
+                self._revalidate_in_thread(key, compute, should_cache)
+            return value
+
+        with self._lock:
+            future = self._sync_inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._sync_inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._store_result(key, value, should_cache)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._sync_inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+            if self.max_bytes:
+                stats['bytes'] = self._bytes
+                stats['max_bytes'] = self.max_bytes
+            return stats
+
+    def _expiry(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() + ttl if ttl > 0 else None
+
+    def _write_store(self, key, value, expires_at):
+        try:
+            self._store.set(key, value, expires_at)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("Cache %s: failed to persist %r: %s", self.namespace, key, e)
+        self._purge_store_if_due()
+
+    def _purge_store_if_due(self):
+        # The memory side evicts on every insert; the store is swept for expired and excess rows here
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL
+        try:
+            self._store.purge_expired(self.stale_ttl, self.maxsize, self.max_bytes)
+        except sqlite3.Error as e:
+            logger.warning("Cache %s: failed to purge expired entries: %s", self.namespace, e)
+
+    def _store_result(self, key, value, should_cache):
+        if should_cache is None or should_cache(value):
+            self.set(key, value)
+
+    async def _astore_result(self, key, value, should_cache):
+        if should_cache is None or should_cache(value):
+            await self.aset(key, value)
+
+    def _claim_refresh(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _release_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _revalidate_in_task(self, key, loader, should_cache):
+        if not self._claim_refresh(key):
+            return
+
+        async def run():
+            try:
+                await self._astore_result(key, await loader(), should_cache)
+            except Exception as e:
+                logger.warning("Cache %s: background refresh of %r failed: %s", self.namespace, key, e)
+            finally:
+                self._release_refresh(key)
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _revalidate_in_thread(self, key, compute, should_cache):
+        if not self._claim_refresh(key):
+            return
+
+        def run():
+            try:
+                self._store_result(key, compute(), should_cache)
+            except Exception as e:
+                logger.warning("Cache %s: background refresh of %r failed: %s", self.namespace, key, e)
+            finally:
+                self._release_refresh(key)
+
+        threading.Thread(target=run, name=f'cache-refresh-{self.namespace}', daemon=True).start()
+
+    def _lookup(self, key, allow_stale):
+        """Return (value, fresh) or _MISSING, updating hit/miss counters."""
+        found = self._lookup_memory(key, allow_stale)
+        if found is _MISSING and self._store:
+            found = self._adopt_stored(key, self._read_store(key, allow_stale))
+        return self._count_miss(found)
+
+    async def _alookup(self, key, allow_stale):
+        """`_lookup` that reads the SQLite store on a worker thread."""
+        found = self._lookup_memory(key, allow_stale)
+        if found is _MISSING and self._store:
+            found = self._adopt_stored(key, await asyncio.to_thread(self._read_store, key, allow_stale))
+        return self._count_miss(found)
+
+    def _lookup_memory(self, key, allow_stale):
+        now = time.time()
+        grace = self.stale_ttl if allow_stale else 0
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at + grace > now:
+                    self._data.move_to_end(key)
+                    return self._count_hit(value, expires_at > now)
+                if expires_at + self.stale_ttl <= now:
+                    self._forget(key)
+        return _MISSING
+
+    def _read_store(self, key, allow_stale):
+        try:
+            return self._store.get(key, self.stale_ttl if allow_stale else 0)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("Cache %s: failed to read %r: %s", self.namespace, key, e)
+            return None
+
+    def _adopt_stored(self, key, stored):
+        if stored is None:
+            return _MISSING
+        expires_at, value = stored
+        self._remember(key, value, expires_at)
+        with self._lock:
+            return self._count_hit(value, expires_at > time.time())
+
+    def _count_miss(self, found):
+        if found is _MISSING:
+            with self._lock:
+                self.misses += 1
+        return found
+
+    def _count_hit(self, value, fresh):
+        self.hits += 1
+        if not fresh:
+            self.stale_hits += 1
+        return value, fresh
+
+    def _remember(self, key, value, expires_at):
+        weight = self._weigher(value) if self._weigher else 0
+        with self._lock:
+            self._forget(key)
+            self._data[key] = (expires_at, value, weight)
+            self._bytes += weight
+            while len(self._data) > self.maxsize or (self.max_bytes and self._bytes > self.max_bytes and len(self._data) > 1):
+                _, (_, _, evicted_weight) = self._data.popitem(last=False)
+                self._bytes -= evicted_weight
+                self.evictions += 1
+
+    def _forget(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+__all__ = ["TTLCache", "SQLiteStore", "Codec", "JSON_CODEC"]
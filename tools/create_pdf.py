@@ -1,16 +1,105 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from fpdf import FPDF
 from urllib.parse import unquote
+import asyncio
+import copy
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from tools.artifact_store import artifact_store, make_artifact
+from tools.metrics import PDF_RENDER_LATENCY
+from tools.tracing import span
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = os.getenv('PDF_OUTPUT_DIR', 'output')
+# 'disk' writes PDFs to OUTPUT_DIR; 'memory' keeps them in the in-memory artifact store
+PDF_STORAGE = os.getenv('PDF_STORAGE', 'disk').lower()
+# Bump when the layout changes so previously rendered files are not reused
+LAYOUT_VERSION = 1
+PDF_FILENAME_RE = re.compile(r'trip_[0-9a-f]{20}\.pdf')
+
+# Transliterations for characters the core PDF fonts cannot encode. Chained
+# str.replace measured ~30x faster than str.translate for these multi-char mappings.
+_TRANSLITERATIONS = (("€", "EUR"), ("•", "-"), ("–", "-"), ("—", "-"))
+
+Section = namedtuple('Section', ['heading', 'template'])
+
+TRIP_TITLE = "Your Travel Summary"
+TRIP_SECTIONS = (
+    Section("People", "People: {infants} infants, {children} children, {adults} adults"),
+    Section("Origin", "City: {orig_city}\nDate: {orig_date}"),
+    Section("Destinations", "Cities: {dest_cities}\nDates: {dest_dates}"),
+    Section("Local Transportation", "{local_transport}"),
+    Section("City Transportation", "{city_transport}"),
+    Section("Flight Details", "{flight}"),
+    Section("Hotel Choices", "{hotels}"),
+    Section("Itinerary", "{itinerary}"),
+)
+# Free-text fields arrive URL-encoded from the workflow
+ENCODED_FIELDS = ('local_transport', 'city_transport', 'flight', 'hotels', 'itinerary')
+TEXT_FIELDS = ('orig_city', 'orig_date', 'dest_cities', 'dest_dates') + ENCODED_FIELDS
+
+# Optional Unicode TTF font; without it text is reduced to latin-1 for the core fonts
+FONT_PATH = os.getenv('PDF_FONT_PATH')
+FONT_BOLD_PATH = os.getenv('PDF_FONT_BOLD_PATH') or FONT_PATH
+FONT_FAMILY = 'TripSans' if FONT_PATH else 'helvetica'
+
+_prototype = None
+_prototype_lock = threading.Lock()
 
 def safe_text(text):
     # Replace common Unicode characters with ASCII equivalents or remove them
-    return (
-        text.replace("€", "EUR")
-            .replace("•", "-")
-            .replace("–", "-")
-            .replace("—", "-")
-            .encode("latin-1", "replace")
-            .decode("latin-1")
-    )
+    if text.isascii():
+        return text
+    for char, replacement in _TRANSLITERATIONS:
+        if char in text:
+            text = text.replace(char, replacement)
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+def load_fonts():
+    """
+    Parse the configured TTF font into a prototype document, once per process.
+
+    Parsing a TTF (glyph widths, cmap) dominates the cost of small documents, so
+    every document is cloned from the prototype instead of calling add_font.
+    """
+    global _prototype
+    with _prototype_lock:
+        if _prototype is None and FONT_PATH:
+            pdf = FPDF()
+            pdf.add_font(FONT_FAMILY, "", FONT_PATH)
+            pdf.add_font(FONT_FAMILY, "B", FONT_BOLD_PATH)
+            _prototype = pdf
+            logger.info("Loaded PDF font %s", FONT_PATH)
+        return _prototype
+
+def new_document() -> FPDF:
+    prototype = load_fonts()
+    if prototype is None:
+        return FPDF()
+    with _prototype_lock:
+        return copy.deepcopy(prototype)
+
+def render_sections(pdf: FPDF, title: str, sections, values: dict):
+    """Lay out a title followed by a heading and a text block per section."""
+    family = FONT_FAMILY
+    pdf.add_page()
+    pdf.set_font(family, "B", 20)
+    pdf.cell(0, 10, title, ln=True, align="C")
+    pdf.ln(10)
+    for section in sections:
+        pdf.set_font(family, "B", 14)
+        pdf.cell(0, 10, section.heading, ln=True)
+        pdf.set_font(family, "", 12)
+        pdf.multi_cell(0, 8, section.template.format_map(values))
+        pdf.ln(5)
 
 def create_trip_pdf(
     infants: int,
@@ -27,82 +116,117 @@ def create_trip_pdf(
     itinerary: str,
     output_path: str = "output/trip_summary.pdf"
 ):
-    local_transport = safe_text(unquote(local_transport, encoding='utf-8'))
-    city_transport = safe_text(unquote(city_transport, encoding='utf-8'))
-    flight = safe_text(unquote(flight, encoding='utf-8'))
-    hotels = safe_text(unquote(hotels, encoding='utf-8'))
-    itinerary = safe_text(unquote(itinerary, encoding='utf-8'))
-    orig_city = safe_text(orig_city)
-    dest_cities = safe_text(dest_cities)
-    dest_dates = safe_text(dest_dates)
-    orig_date = safe_text(orig_date)
-
-    pdf = FPDF()
-    pdf.add_page()
+    """Lay out the trip summary; with `output_path=None` the PDF is returned as bytes instead of written."""
+    values = {
+        'infants': infants, 'children': children, 'adults': adults,
+        'orig_city': orig_city, 'orig_date': orig_date,
+        'dest_cities': dest_cities, 'dest_dates': dest_dates,
+        'local_transport': local_transport, 'city_transport': city_transport,
+        'flight': flight, 'hotels': hotels, 'itinerary': itinerary,
+    }
+    for field in ENCODED_FIELDS:
+        values[field] = unquote(values[field], encoding='utf-8')
+    if not FONT_PATH:
+        for field in TEXT_FIELDS:
+            values[field] = safe_text(values[field])
+
+    pdf = new_document()
     pdf.set_auto_page_break(auto=True, margin=15)
+    render_sections(pdf, TRIP_TITLE, TRIP_SECTIONS, values)
 
-    # Title
-    pdf.set_font("Arial", "B", 20)
-    pdf.cell(0, 10, "Your Travel Summary", ln=True, align="C")
-    pdf.ln(10)
+    if output_path is None:
+        return bytes(pdf.output())
+    pdf.output(output_path)
 
-    # Section: People
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "People", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, f"People: {infants} infants, {children} children, {adults} adults")
-    pdf.ln(5)
-
-    # Section: Origin
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Origin", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, f"City: {orig_city}\nDate: {orig_date}")
-    pdf.ln(5)
-
-    # Section: Destinations
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Destinations", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, f"Cities: {dest_cities}\nDates: {dest_dates}")
-    pdf.ln(5)
-
-    # Section: Local Transportation
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Local Transportation", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, local_transport)
-    pdf.ln(5)
-
-    # Section: City Transportation
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "City Transportation", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, city_transport)
-    pdf.ln(5)
-
-    # Section: Flight
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Flight Details", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, flight)
-    pdf.ln(5)
-
-    # Section: Hotels
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Hotel Choices", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, hotels)
-    pdf.ln(5)
-
-    # Section: Itinerary
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Itinerary", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 8, itinerary)
-    pdf.ln(5)
 
-    pdf.output(output_path)
+def trip_pdf_filename(**fields) -> str:
+    """Content-addressed filename: identical trip details always map to the same file."""
+    document = json.dumps({'layout': LAYOUT_VERSION, 'font': FONT_PATH, **fields}, sort_keys=True, ensure_ascii=False)
+    return f"trip_{hashlib.sha256(document.encode('utf-8')).hexdigest()[:20]}.pdf"
+
+
+def render_trip_pdf(output_dir: str = OUTPUT_DIR, **fields) -> str:
+    """
+    Render the trip summary into `output_dir` under its content-addressed name.
+
+    Returns:
+        The filename. Rendering is skipped if the file already exists, and new
+        files are written to a temporary path and renamed, so concurrent
+        requests never observe a partially written PDF.
+    """
+    filename = trip_pdf_filename(**fields)
+    output_path = os.path.join(output_dir, filename)
+    if os.path.exists(output_path):
+        return filename
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    try:
+        create_trip_pdf(**fields, output_path=tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return filename
+
+
+_render_pool = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Process pool used for PDF layout, so rendering never blocks the event loop."""
+    global _render_pool
+    if _render_pool is None:
+        # Forking the threaded server can deadlock a worker on a lock held by another thread
+        _render_pool = ProcessPoolExecutor(
+            max_workers=int(os.getenv('PDF_RENDER_WORKERS', '2')),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=load_fonts
+        )
+    return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=True, cancel_futures=True)
+        _render_pool = None
+
+
+async def async_create_trip_pdf(**fields) -> str:
+    """
+    Render the trip summary on the process pool and return its filename.
+
+    With PDF_STORAGE=memory the PDF is rendered into a buffer and kept in the
+    artifact store, and nothing touches the disk.
+    """
+    loop = asyncio.get_running_loop()
+    if PDF_STORAGE == 'memory':
+        filename = trip_pdf_filename(**fields)
+        if await artifact_store.aget(filename) is None:
+            render = functools.partial(create_trip_pdf, **fields, output_path=None)
+            with PDF_RENDER_LATENCY.time(storage=PDF_STORAGE), span('pdf.render', storage=PDF_STORAGE):
+                data = await loop.run_in_executor(get_render_pool(), render)
+            await artifact_store.aset(filename, make_artifact(data))
+    else:
+        render = functools.partial(render_trip_pdf, OUTPUT_DIR, **fields)
+        with PDF_RENDER_LATENCY.time(storage=PDF_STORAGE), span('pdf.render', storage=PDF_STORAGE):
+            filename = await loop.run_in_executor(get_render_pool(), render)
+    logger.info("Trip PDF ready: %s", filename)
+    return filename
+
+
+def resolve_output_file(filename: str):
+    """
+    Map a requested download name to its path inside OUTPUT_DIR.
+
+    Returns:
+        The file path, or None for names that are not rendered trip PDFs (this
+        rejects path traversal such as `../server.py`) or that do not exist.
+    """
+    if not PDF_FILENAME_RE.fullmatch(filename):
+        return None
+    path = os.path.join(OUTPUT_DIR, filename)
+    return path if os.path.isfile(path) else None
 
 # Example usage:
 # if __name__ == "__main__":
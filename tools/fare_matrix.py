@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+import asyncio
+import logging
+import os
+from tools.search_flights import OUTPUT_FORMATS, async_fetch_flight_offers, build_flight_search_body, dumps_compact
+
+logger = logging.getLogger(__name__)
+
+# Date-pair searches in flight at once for one matrix (the Amadeus scheduler still applies)
+FARE_MATRIX_CONCURRENCY = int(os.getenv('FARE_MATRIX_CONCURRENCY', '8'))
+# Largest grid a single request may ask for
+FARE_MATRIX_MAX_CELLS = int(os.getenv('FARE_MATRIX_MAX_CELLS', '49'))
+
+
+def date_range(start: str, end: str, max_days: int = None):
+    """Inclusive list of ISO dates from `start` to `end`, at most `max_days` long."""
+    first, last = date.fromisoformat(start), date.fromisoformat(end or start)
+    if last < first:
+        raise ValueError(f"Date window {start}..{end} ends before it starts")
+    days = (last - first).days + 1
+    if max_days is not None and days > max_days:
+        raise ValueError(f"Date window {start}..{end} spans {days} days; narrow it to at most {max_days}")
+    return [(first + timedelta(days=n)).isoformat() for n in range(days)]
+
+
+def cheapest_offer(offers):
+    """(price, currency) of the cheapest offer, or None if there are none."""
+    prices = []
+    for offer in offers:
+        try:
+            prices.append((float(offer['price']['total']), offer['price'].get('currency', '')))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return min(prices, default=None)
+
+
+async def async_fare_matrix(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
+                            orig_date_from: str, orig_date_to: str, dept_date_from: str, dept_date_to: str,
+                            infant_count: int, child_count: int, adult_count: int,
+                            output_format: str = 'text'):
+    """
+    Cheapest fare for every departure/return date pair in two date windows.
+
+    Every cell is a regular flight search through the flight cache, so
+    repeated or overlapping grids are served from cache, concurrent identical
+    searches are coalesced, and a follow-up search_flights call for the chosen
+    dates is a cache hit. Cells run concurrently, bounded by
+    FARE_MATRIX_CONCURRENCY, so the grid takes about as long as one search.
+
+    Returns:
+        str: Markdown price matrix, or compact JSON with output_format='json'
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+    # Bound each window before building the grid, so huge windows are rejected without allocating it
+    departures = date_range(orig_date_from, orig_date_to, max_days=FARE_MATRIX_MAX_CELLS)
+    returns = date_range(dept_date_from, dept_date_to, max_days=FARE_MATRIX_MAX_CELLS)
+    pairs = [(out, back) for out in departures for back in returns if back >= out]
+    if not pairs:
+        raise ValueError("No return date falls on or after a departure date")
+    if len(pairs) > FARE_MATRIX_MAX_CELLS:
+        raise ValueError(f"Date windows span {len(pairs)} date pairs; narrow them to at most {FARE_MATRIX_MAX_CELLS}")
+
+    semaphore = asyncio.Semaphore(FARE_MATRIX_CONCURRENCY)
+
+    async def search(out, back):
+        body = build_flight_search_body(orig_location_code, dest_location_code, dest2_location_code,
+                                        out, back, infant_count, child_count, adult_count)
+        async with semaphore:
+            return cheapest_offer(await async_fetch_flight_offers(body))
+
+    results = await asyncio.gather(*(search(out, back) for out, back in pairs), return_exceptions=True)
+    cells = {}
+    for pair, result in zip(pairs, results):
+        if isinstance(result, BaseException):
+            logger.warning("Fare matrix search %s failed: %s", pair, result)
+            result = None
+        cells[pair] = result
+
+    priced = [(cell[0], pair, cell[1]) for pair, cell in cells.items() if cell is not None]
+    cheapest = min(priced, default=None)
+    if output_format == 'json':
+        return dumps_compact({
+            'departure_dates': departures,
+            'return_dates': returns,
+            # Rows follow departure_dates and columns return_dates; null where no fare was found
+            'prices': [[cells[(out, back)][0] if cells.get((out, back)) else None for back in returns]
+                       for out in departures],
+            'currency': cheapest[2] if cheapest else None,
+            'cheapest': {'departure': cheapest[1][0], 'return': cheapest[1][1], 'price': cheapest[0]} if cheapest else None,
+        })
+    return format_fare_matrix(orig_location_code, dest_location_code, dest2_location_code,
+                              departures, returns, cells, cheapest)
+
+
+def format_fare_matrix(orig_location_code, dest_location_code, dest2_location_code,
+                       departures, returns, cells, cheapest):
+    lines = [
+        f"# Cheapest fares {orig_location_code} -> {dest_location_code}, "
+        f"{dest2_location_code} -> {orig_location_code} ({cheapest[2] if cheapest else 'no fares found'})",
+        "",
+        "| Depart \\ Return | " + " | ".join(back[5:] for back in returns) + " |",
+        "|---" * (len(returns) + 1) + "|",
+    ]
+    for out in departures:
+        row = []
+        for back in returns:
+            cell = cells.get((out, back))
+            row.append('-' if (out, back) not in cells else ('n/a' if cell is None else f"{cell[0]:.0f}"))
+        lines.append(f"| {out} | " + " | ".join(row) + " |")
+    if cheapest:
+        lines.append("")
+        lines.append(f"Cheapest: depart {cheapest[1][0]}, return {cheapest[1][1]} for {cheapest[0]:.2f} {cheapest[2]}. "
+                     "Call search_flights with these dates for the flight options.")
+    return '\n'.join(lines) + '\n'
+
+
+__all__ = ["async_fare_matrix", "format_fare_matrix", "date_range", "cheapest_offer"]
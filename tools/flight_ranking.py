@@ -0,0 +1,108 @@
+from collections import namedtuple
+from datetime import datetime
+import heapq
+import os
+import re
+
+RankWeights = namedtuple('RankWeights', ['price', 'duration', 'stops', 'layover'])
+
+DEFAULT_WEIGHTS = RankWeights(price=1.0, duration=0.5, stops=0.3, layover=0.2)
+
+_DURATION_RE = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?')
+
+
+def parse_weights(spec: str) -> RankWeights:
+    """
+    Parse weights such as "price=1,duration=0.5,stops=0.3,layover=0.2".
+    Omitted criteria keep their default weight; 0 disables a criterion.
+    """
+    weights = DEFAULT_WEIGHTS._asdict()
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, _, value = item.partition('=')
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"Unknown ranking criterion {name!r}; choose from {', '.join(RankWeights._fields)}")
+        weights[name] = float(value)
+    return RankWeights(**weights)
+
+
+def rank_weights_from_env() -> RankWeights:
+    return parse_weights(os.getenv('FLIGHT_RANK_WEIGHTS', ''))
+
+
+def duration_minutes(duration: str):
+    """Minutes in an ISO 8601 duration such as PT13H45M or P1DT2H; None if unparseable."""
+    match = _DURATION_RE.fullmatch(duration or '')
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes = (int(group or 0) for group in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def offer_features(offer):
+    """
+    Ranking criteria of one flight offer: (price, total duration in minutes,
+    number of stops, total layover minutes). Unparseable criteria are None.
+    """
+    try:
+        price = float(offer['price']['total'])
+    except (KeyError, TypeError, ValueError):
+        price = None
+    duration = 0
+    stops = 0
+    layover = 0
+    for itinerary in offer.get('itineraries', []):
+        minutes = duration_minutes(itinerary.get('duration'))
+        duration = None if duration is None or minutes is None else duration + minutes
+        segments = itinerary.get('segments', [])
+        stops += max(0, len(segments) - 1) + sum(segment.get('numberOfStops', 0) or 0 for segment in segments)
+        for previous, following in zip(segments, segments[1:]):
+            try:
+                gap = (datetime.fromisoformat(following['departure']['at'])
+                       - datetime.fromisoformat(previous['arrival']['at']))
+                layover = None if layover is None else layover + gap.total_seconds() / 60
+            except (KeyError, TypeError, ValueError):
+                layover = None
+    return price, duration, stops, layover
+
+
+def score_offers(offers, weights: RankWeights = DEFAULT_WEIGHTS):
+    """
+    Weighted score per offer; lower is better.
+
+    Each criterion is min-max normalized over the offer set so weights are
+    comparable across units. A missing criterion scores as the worst value.
+    """
+    features = [offer_features(offer) for offer in offers]
+    scores = [0.0] * len(offers)
+    for column, weight in enumerate(weights):
+        if not weight:
+            continue
+        values = [row[column] for row in features if row[column] is not None]
+        low = min(values, default=0)
+        span = max(values, default=0) - low
+        for i, row in enumerate(features):
+            value = row[column]
+            normalized = 1.0 if value is None else ((value - low) / span if span else 0.0)
+            scores[i] += weight * normalized
+    return scores
+
+
+def rank_offers(offers, weights: RankWeights = DEFAULT_WEIGHTS, limit: int = 4, offset: int = 0):
+    """
+    Return the offers ranked offset+1 .. offset+limit, best first.
+
+    Uses a heap-based partial sort, so only the requested prefix of the
+    ranking is ordered. Ties keep the API's order.
+    """
+    if offset < 0 or limit < 0:
+        raise ValueError("offset and limit must not be negative")
+    scores = score_offers(offers, weights)
+    best = heapq.nsmallest(offset + limit, range(len(offers)), key=lambda i: (scores[i], i))
+    return [offers[i] for i in best[offset:]]
+
+
+__all__ = ["RankWeights", "DEFAULT_WEIGHTS", "parse_weights", "rank_weights_from_env",
+           "offer_features", "score_offers", "rank_offers"]
@@ -1,252 +1,457 @@
-from playwright.async_api import async_playwright
 import asyncio
 import json
+import re
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
 from typing import List, Dict, Any
+from urllib.parse import quote_plus
 from langchain.agents import Tool
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 import logging
 import os
+from tools.browser_pool import BrowserPool, get_browser_pool
+from tools.cache import TTLCache
+from tools.metrics import SEARCH_PHASE_LATENCY
+from tools.retry import backoff_delay
+from tools.tracing import span
 
 logger = logging.getLogger(__name__)
 
-async def async_google_search(query: str, max_retries: int = 2) -> str:
+# Overridable to point the scraper at a local SERP stub (stubs/google_stub.py)
+GOOGLE_BASE_URL = os.getenv('GOOGLE_SEARCH_BASE_URL', 'https://www.google.com').rstrip('/')
+
+# Fast path skips the homepage warmup and the networkidle wait
+FAST_PATH = os.getenv('GOOGLE_SEARCH_FAST_PATH', '1') != '0'
+# Save screenshots and page dumps of every attempt
+DEBUG = os.getenv('GOOGLE_SEARCH_DEBUG', '0') == '1'
+
+# Present once results (or a verification challenge) have been rendered
+RESULTS_READY_SELECTOR = "#rso, #search, #captcha-form, #recaptcha"
+RESULTS_READY_TIMEOUT_MS = 10000
+
+RESULTS_HEADER = "🔍 Google Search Results:"
+# Boundary between the numbered entries of a formatted result page
+_RESULT_SPLIT_RE = re.compile(r'\n\n(?=\d+\. )')
+
+# Successful result pages keyed on the normalized query; TTL 0 disables caching
+search_cache = TTLCache(
+    maxsize=int(os.getenv('GOOGLE_SEARCH_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('GOOGLE_SEARCH_CACHE_TTL', '21600')),
+    sqlite_path=os.getenv('GOOGLE_SEARCH_CACHE_DB') or os.getenv('SHARED_CACHE_DB') or None,
+    namespace='google_search'
+)
+
+# Try multiple selector strategies
+SELECTORS_TO_TRY = [
+    "div.g",                   # Traditional selector
+    "div.MjjYud",              # New main selector
+    "div.kvH3mc",              # Alternative selector
+    "[data-ved]",              # Attribute-based selector
+    "div[data-hveid]",         # Data attribute selector
+    "div:has(h3)",             # Div containing h3
+    ".tF2Cxc",                 # Another possible selector
+]
+TITLE_SELECTORS = ["h3", "h1", "h2", "[role='heading']"]
+DESC_SELECTORS = [
+    ".VwiC3b", ".s3v9rd", ".hgKElc", ".IsZvec",
+    "span:not(:has(a))", "div:not(:has(h3)):not(:has(a))"
+]
+
+
+class PhaseStats:
+    """Rolling window of per-phase latencies (seconds) for the search pipeline."""
+
+    def __init__(self, window: int = 500):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, timings: Dict[str, float]):
+        for phase, seconds in timings.items():
+            self._samples[phase].append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Return count, p50 and p95 in milliseconds for every phase seen so far."""
+        summary = {}
+        for phase, samples in list(self._samples.items()):
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            summary[phase] = {
+                'count': len(ordered),
+                'p50_ms': round(_percentile(ordered, 0.50) * 1000, 1),
+                'p95_ms': round(_percentile(ordered, 0.95) * 1000, 1),
+            }
+        return summary
+
+
+def _percentile(ordered, q):
+    return ordered[round(q * (len(ordered) - 1))]
+
+
+class _PhaseTimer:
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            with span(f'google_search.{name}'):
+                yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+
+phase_stats = PhaseStats()
+
+
+def search_phase_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-phase latency percentiles of recent google_search attempts."""
+    return phase_stats.summary()
+
+
+def search_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the google_search result cache."""
+    return search_cache.stats()
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so equivalent queries share a cache entry."""
+    return " ".join(query.lower().split())
+
+
+# Runs the whole selector cascade inside the page so extraction is one round trip
+EXTRACT_RESULTS_JS = """
+({selectors, titleSelectors, descSelectors, limit}) => {
+    const first = (root, sel) => {
+        try { return root.querySelector(sel); } catch (e) { return null; }
+    };
+    for (const selector of selectors) {
+        let elements;
+        try { elements = Array.from(document.querySelectorAll(selector)); } catch (e) { continue; }
+        const valid = elements.filter(el => el.querySelector('h3, h1, h2') || el.querySelector('a'));
+        if (!valid.length) continue;
+        const records = valid.slice(0, limit).map(el => {
+            let title = '';
+            for (const sel of titleSelectors) {
+                const node = first(el, sel);
+                if (node && node.innerText && node.innerText.trim()) { title = node.innerText; break; }
+            }
+            const anchor = el.querySelector('a');
+            const link = anchor ? (anchor.getAttribute('href') || '') : '';
+            let description = '';
+            for (const sel of descSelectors) {
+                const node = first(el, sel);
+                if (node && node.innerText && node.innerText.trim().length > 15) { description = node.innerText; break; }
+            }
+            return {title, link, description};
+        });
+        return {selector, count: valid.length, records};
+    }
+    return {selector: null, count: 0, records: []};
+}
+"""
+
+
+def _build_result(i, title, link, description):
+    """Clean one raw title/link/description triple; returns None for invalid results."""
+    # Clean Google redirect links
+    if link and link.startswith('/url?q='):
+        link = link.split('/url?q=')[1].split('&')[0]
+    if description and len(description) > 300:
+        description = description[:300] + "..."
+
+    # Only add valid results
+    if title and title.strip() and len(title.strip()) > 3:
+        logger.debug("Result %d: %s...", i + 1, title[:50])
+        return {
+            "title": title.strip(),
+            "url": link or "No URL available",
+            "description": description or "No description available"
+        }
+    logger.debug("Result %d: invalid or empty title", i + 1)
+    return None
+
+
+async def _extract_results_in_page(page, limit: int = 5):
     """
-    Enhanced Google search with better debugging
+    Extract results with a single page.evaluate call.
+
+    Returns:
+        tuple | None: (number of result containers found, cleaned results), or
+        None if the in-page script failed and the locator cascade should be used
     """
-    for attempt in range(max_retries):
+    try:
+        extracted = await page.evaluate(EXTRACT_RESULTS_JS, {
+            'selectors': SELECTORS_TO_TRY,
+            'titleSelectors': TITLE_SELECTORS,
+            'descSelectors': DESC_SELECTORS,
+            'limit': limit,
+        })
+    except Exception as e:
+        logger.warning("In-page extraction failed: %s", e)
+        return None
+
+    if not extracted['selector']:
+        return 0, []
+    logger.debug("Found %d results with selector: %s", extracted['count'], extracted['selector'])
+    results = []
+    for i, record in enumerate(extracted['records']):
+        result_data = _build_result(i, record['title'], record['link'], record['description'])
+        if result_data:
+            results.append(result_data)
+    return extracted['count'], results
+
+
+async def _find_result_elements(page):
+    for selector in SELECTORS_TO_TRY:
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    ]
-                )
-                
-                context = await browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                )
-                
-                page = await context.new_page()
-                
-                # Anti-detection script
-                await page.add_init_script("""
-                    Object.defineProperty(navigator, 'webdriver', {
-                        get: () => undefined,
-                    });
-                    delete navigator.webdriver;
-                """)
-                
-                print(f"🔍 Attempt {attempt + 1}: Searching for '{query}'")
-                
-                # First visit Google homepage
-                await page.goto('https://www.google.com', timeout=15000)
-                await page.wait_for_timeout(2000)
-                
-                # Execute search
-                search_url = f"https://www.google.com/search?q={query}&hl=en&num=10"
-                print(f"📡 Navigating to: {search_url}")
-                
-                response = await page.goto(search_url, wait_until='networkidle', timeout=15000)
-                print(f"📄 Response status: {response.status}")
-                
-                # Wait for page to load
-                await page.wait_for_timeout(3000)
-                
-                # Screenshot for debugging
-                screenshot_path = f'debug_search_{attempt}.png'
-                await page.screenshot(path=screenshot_path)
-                print(f"📸 Screenshot saved: {screenshot_path}")
-                
-                # Check page title and basic information
-                page_title = await page.title()
-                page_url = page.url
-                print(f"📋 Page title: {page_title}")
-                print(f"🌐 Current URL: {page_url}")
-                
-                # Check if redirected or showing verification page
-                if "sorry" in page_title.lower() or "captcha" in page_title.lower():
-                    print("⚠️ Google CAPTCHA or verification detected!")
-                    await browser.close()
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(5)
-                        continue
-                    return "Google verification required. Please try again later."
-                
-                # Try multiple selector strategies
-                selectors_to_try = [
-                    "div.g",                   # Traditional selector
-                    "div.MjjYud",              # New main selector
-                    "div.kvH3mc",              # Alternative selector
-                    "[data-ved]",              # Attribute-based selector
-                    "div[data-hveid]",         # Data attribute selector
-                    "div:has(h3)",             # Div containing h3
-                    ".tF2Cxc",                 # Another possible selector
-                ]
-                
-                search_results = []
-                successful_selector = None
-                
-                for selector in selectors_to_try:
-                    try:
-                        elements = await page.locator(selector).all()
-                        if elements and len(elements) > 0:
-                            # Filter out elements that are obviously not search results
-                            valid_elements = []
-                            for element in elements:
-                                try:
-                                    # Check if element contains title element
-                                    has_title = await element.locator("h3, h1, h2").count() > 0
-                                    has_link = await element.locator("a").count() > 0
-                                    if has_title or has_link:
-                                        valid_elements.append(element)
-                                except:
-                                    continue
-                            
-                            if valid_elements:
-                                search_results = valid_elements
-                                successful_selector = selector
-                                print(f"✅ Found {len(search_results)} results with selector: {selector}")
-                                break
-                    except Exception as e:
-                        print(f"❌ Selector '{selector}' failed: {e}")
-                        continue
-                
-                if not search_results:
-                    # Get page content for debugging
-                    page_content = await page.content()
-                    print(f"📄 Page content length: {len(page_content)}")
-                    print(f"📄 Page content preview:\n{page_content[:1000]}...")
-                    
-                    # Save full page content to file
-                    with open(f'debug_page_content_{attempt}.html', 'w', encoding='utf-8') as f:
-                        f.write(page_content)
-                    print(f"💾 Full page content saved to debug_page_content_{attempt}.html")
-                    
-                    await browser.close()
-                    if attempt < max_retries - 1:
-                        print(f"🔄 No results found, retrying in 5 seconds...")
-                        await asyncio.sleep(5)
-                        continue
-                    return "No search results found after trying multiple selectors."
-                
-                # Extract search results
-                results = []
-                print(f"🔍 Extracting data from {len(search_results)} results...")
-                
-                for i, result in enumerate(search_results[:5]):
+            elements = await page.locator(selector).all()
+            if elements and len(elements) > 0:
+                # Filter out elements that are obviously not search results
+                valid_elements = []
+                for element in elements:
                     try:
-                        print(f"📝 Processing result {i+1}...")
-                        
-                        # Extract title
-                        title = ""
-                        title_selectors = ["h3", "h1", "h2", "[role='heading']"]
-                        for title_sel in title_selectors:
-                            try:
-                                title_element = result.locator(title_sel).first
-                                if await title_element.count() > 0:
-                                    title = await title_element.inner_text()
-                                    if title and title.strip():
-                                        break
-                            except:
-                                continue
-                        
-                        # Extract link
-                        link = ""
-                        try:
-                            link_element = result.locator("a").first
-                            if await link_element.count() > 0:
-                                link = await link_element.get_attribute("href")
-                                # Clean Google redirect links
-                                if link and link.startswith('/url?q='):
-                                    link = link.split('/url?q=')[1].split('&')[0]
-                        except:
-                            pass
-                        
-                        # Extract description
-                        description = ""
-                        desc_selectors = [
-                            ".VwiC3b", ".s3v9rd", ".hgKElc", ".IsZvec",
-                            "span:not(:has(a))", "div:not(:has(h3)):not(:has(a))"
-                        ]
-                        for desc_sel in desc_selectors:
-                            try:
-                                desc_element = result.locator(desc_sel).first
-                                if await desc_element.count() > 0:
-                                    desc_text = await desc_element.inner_text()
-                                    if desc_text and len(desc_text.strip()) > 15:
-                                        description = desc_text[:300] + "..." if len(desc_text) > 300 else desc_text
-                                        break
-                            except:
-                                continue
-                        
-                        # Only add valid results
-                        if title and title.strip() and len(title.strip()) > 3:
-                            result_data = {
-                                "title": title.strip(),
-                                "url": link or "No URL available",
-                                "description": description or "No description available"
-                            }
-                            results.append(result_data)
-                            print(f"✅ Result {i+1}: {title[:50]}...")
-                        else:
-                            print(f"⚠️ Result {i+1}: Invalid or empty title")
-                            
-                    except Exception as e:
-                        print(f"❌ Error extracting result {i+1}: {e}")
-                        continue
-                
-                await browser.close()
-                
-                if not results:
-                    if attempt < max_retries - 1:
-                        print(f"🔄 No valid results extracted on attempt {attempt + 1}, retrying...")
-                        await asyncio.sleep(5)
+                        # Check if element contains title element
+                        has_title = await element.locator("h3, h1, h2").count() > 0
+                        has_link = await element.locator("a").count() > 0
+                        if has_title or has_link:
+                            valid_elements.append(element)
+                    except:
                         continue
-                    return "No valid search results could be extracted after all attempts."
-                
-                # Format final results
-                print(f"🎉 Successfully extracted {len(results)} results!")
-                formatted_results = []
-                for i, result in enumerate(results, 1):
-                    formatted_results.append(
-                        f"{i}. {result['title']}\n"
-                        f"URL: {result['url']}\n"
-                        f"Description: {result['description']}"
-                    )
-                
-                final_result = "🔍 Google Search Results:\n\n" + "\n\n".join(formatted_results)
-                print(f"📤 Returning {len(results)} results")
-                return final_result
-                
+
+                if valid_elements:
+                    logger.debug("Found %d results with selector: %s", len(valid_elements), selector)
+                    return valid_elements
         except Exception as e:
-            error_msg = f"Search failed on attempt {attempt + 1}: {str(e)}"
-            print(f"❌ {error_msg}")
-            if attempt < max_retries - 1:
-                print(f"🔄 Retrying in 5 seconds...")
-                await asyncio.sleep(5)
-                continue
-            else:
-                return f"Search failed after all attempts: {str(e)}"
-    
-    return "Search failed after all retries."
+            logger.debug("Selector %r failed: %s", selector, e)
+            continue
+    return []
+
+
+async def _extract_results(search_results):
+    results = []
+    logger.debug("Extracting data from %d results", len(search_results))
+
+    for i, result in enumerate(search_results[:5]):
+        try:
+            logger.debug("Processing result %d", i + 1)
+
+            # Extract title
+            title = ""
+            for title_sel in TITLE_SELECTORS:
+                try:
+                    title_element = result.locator(title_sel).first
+                    if await title_element.count() > 0:
+                        title = await title_element.inner_text()
+                        if title and title.strip():
+                            break
+                except:
+                    continue
+
+            # Extract link
+            link = ""
+            try:
+                link_element = result.locator("a").first
+                if await link_element.count() > 0:
+                    link = await link_element.get_attribute("href")
+            except:
+                pass
+
+            # Extract description
+            description = ""
+            for desc_sel in DESC_SELECTORS:
+                try:
+                    desc_element = result.locator(desc_sel).first
+                    if await desc_element.count() > 0:
+                        desc_text = await desc_element.inner_text()
+                        if desc_text and len(desc_text.strip()) > 15:
+                            description = desc_text
+                            break
+                except:
+                    continue
+
+            result_data = _build_result(i, title, link, description)
+            if result_data:
+                results.append(result_data)
+
+        except Exception as e:
+            logger.debug("Error extracting result %d: %s", i + 1, e)
+            continue
+    return results
+
+
+async def _search_attempt(pool: BrowserPool, query: str, attempt: int, fast_path: bool, timer: _PhaseTimer):
+    """
+    Run one search attempt on a pooled page.
+
+    Returns:
+        tuple: (results, failure_message) - results is None when the attempt failed
+    """
+    acquire_start = time.perf_counter()
+    async with pool.page() as page:
+        timer.timings['acquire'] = time.perf_counter() - acquire_start
+        logger.info("Attempt %d: searching for %r", attempt + 1, query)
+
+        if not fast_path:
+            # First visit Google homepage
+            with timer.phase('warmup'):
+                await page.goto(GOOGLE_BASE_URL, timeout=15000)
+
+        # Execute search
+        search_url = f"{GOOGLE_BASE_URL}/search?q={quote_plus(query)}&hl=en&num=10"
+        logger.debug("Navigating to: %s", search_url)
+
+        with timer.phase('navigate'):
+            response = await page.goto(
+                search_url,
+                wait_until='domcontentloaded' if fast_path else 'networkidle',
+                timeout=15000
+            )
+        logger.debug("Response status: %s", response.status if response else 'N/A')
+
+        # Wait for the result container instead of sleeping a fixed time
+        with timer.phase('wait_results'):
+            try:
+                await page.wait_for_selector(RESULTS_READY_SELECTOR, state='attached', timeout=RESULTS_READY_TIMEOUT_MS)
+            except PlaywrightTimeoutError:
+                logger.warning("Result container did not appear in time")
+
+        if DEBUG:
+            # Screenshot for debugging
+            screenshot_path = f'debug_search_{attempt}.png'
+            await page.screenshot(path=screenshot_path)
+            logger.info("Screenshot saved: %s", screenshot_path)
+
+        # Check page title and basic information
+        page_title = await page.title()
+        logger.debug("Page title: %s, URL: %s", page_title, page.url)
+
+        # Check if redirected or showing verification page
+        if "sorry" in page_title.lower() or "captcha" in page_title.lower():
+            logger.warning("Google CAPTCHA or verification detected")
+            return None, "Google verification required. Please try again later."
+
+        with timer.phase('extract'):
+            extracted = await _extract_results_in_page(page)
+
+        if extracted is not None:
+            found, results = extracted
+        else:
+            # Fall back to the locator-based cascade
+            with timer.phase('select'):
+                search_results = await _find_result_elements(page)
+            found, results = len(search_results), []
+            if search_results:
+                with timer.phase('extract_fallback'):
+                    results = await _extract_results(search_results)
+
+        if not found:
+            # Serializing the page is costly; only do it when someone will look at it
+            if DEBUG or logger.isEnabledFor(logging.DEBUG):
+                page_content = await page.content()
+                logger.debug("Page content length: %d, preview:\n%s...", len(page_content), page_content[:1000])
+
+            if DEBUG:
+                # Save full page content to file
+                with open(f'debug_page_content_{attempt}.html', 'w', encoding='utf-8') as f:
+                    f.write(page_content)
+                logger.info("Full page content saved to debug_page_content_%d.html", attempt)
+            return None, "No search results found after trying multiple selectors."
+
+        if not results:
+            return None, "No valid search results could be extracted after all attempts."
+        return results, None
+
+
+async def async_google_search(query: str, max_retries: int = 2, pool: BrowserPool = None,
+                              fast_path: bool = None, on_result=None) -> str:
+    """
+    Enhanced Google search with better debugging.
+    Results are served from the result cache when possible; concurrent
+    identical queries share one scrape. `on_result(block, total)` receives
+    each search result as soon as the page has been scraped.
+    """
+    query = normalize_query(query)
+    with span('google_search', query=query):
+        text = await search_cache.get_or_load(
+            query,
+            lambda: _scrape_google(query, max_retries, pool, fast_path),
+            should_cache=lambda result: result.startswith(RESULTS_HEADER)
+        )
+    if on_result is not None and text.startswith(RESULTS_HEADER):
+        entries = _RESULT_SPLIT_RE.split(text[len(RESULTS_HEADER):].lstrip('\n'))
+        for entry in entries:
+            await on_result(entry, len(entries))
+    return text
+
+
+async def _scrape_google(query: str, max_retries: int, pool: BrowserPool, fast_path: bool) -> str:
+    """
+    Scrape Google for `query`, retrying with backoff.
+    Pages are borrowed from the process-wide warm browser pool unless `pool` is given.
+    `fast_path` defaults to GOOGLE_SEARCH_FAST_PATH (enabled).
+    """
+    pool = pool or get_browser_pool()
+    fast_path = FAST_PATH if fast_path is None else fast_path
+    failure = "Search failed after all retries."
+
+    for attempt in range(max_retries):
+        timer = _PhaseTimer()
+        try:
+            with timer.phase('total'):
+                results, failure = await _search_attempt(pool, query, attempt, fast_path, timer)
+        except Exception as e:
+            results, failure = None, f"Search failed after all attempts: {str(e)}"
+            logger.warning("Search failed on attempt %d: %s", attempt + 1, e)
+        phase_stats.record(timer.timings)
+        for name, seconds in timer.timings.items():
+            SEARCH_PHASE_LATENCY.observe(seconds, phase=name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Phases: %s", ", ".join(f"{name}={seconds * 1000:.0f}ms"
+                                                 for name, seconds in timer.timings.items()))
+
+        if results:
+            # Format final results
+            logger.info("Extracted %d results for %r", len(results), query)
+            formatted_results = []
+            for i, result in enumerate(results, 1):
+                formatted_results.append(
+                    f"{i}. {result['title']}\n"
+                    f"URL: {result['url']}\n"
+                    f"Description: {result['description']}"
+                )
+
+            final_result = RESULTS_HEADER + "\n\n" + "\n\n".join(formatted_results)
+            return final_result
+
+        if attempt < max_retries - 1:
+            delay = backoff_delay(attempt, cap=8.0)
+            logger.info("Retrying in %.1f seconds", delay)
+            await asyncio.sleep(delay)
+
+    return failure
+
+async def _search_with_private_pool(query: str) -> str:
+    # asyncio.run() creates a fresh event loop, so the shared pool cannot be used here
+    pool = BrowserPool(size=1)
+    try:
+        return await async_google_search(query, pool=pool)
+    finally:
+        await pool.close()
 
 def google_search(query: str) -> str:
     """
     Synchronous wrapper with error handling
     """
     try:
-        print(f"🚀 Starting Google search for: '{query}'")
-        result = asyncio.run(async_google_search(query))
-        print(f"✅ Search completed")
+        logger.info("Starting Google search for: %r", query)
+        result = asyncio.run(_search_with_private_pool(query))
+        logger.info("Search completed")
         return result
     except Exception as e:
         error_msg = f"Search error: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error("%s", error_msg)
         return error_msg
 
 # Create Langchain tool
@@ -256,4 +461,4 @@ google_search_tool = Tool(
     func=google_search
 )
 
-__all__ = ["google_search", "async_google_search", "google_search_tool"]
\ No newline at end of file
+__all__ = ["google_search", "async_google_search", "google_search_tool", "search_phase_stats", "search_cache_stats"]
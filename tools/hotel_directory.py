@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HotelDirectory:
+    """
+    Local directory of hotel listings keyed by city code, persisted in SQLite.
+
+    Hotel lists for a city rarely change, so a listing is fetched once and then
+    served locally. Listings older than `ttl` seconds are still served, and a
+    background task refreshes them. An empty listing is only kept for
+    `empty_ttl` seconds and then fetched again as if unknown. The SQLite file
+    is opened on first use.
+
+    All fetches, refreshes and preloads go through `afetch` on the event loop,
+    so they share the async client's scheduler and token. Blocking callers on
+    other threads use `get`, which runs `aget` on that loop.
+
+    Args:
+        afetch: Coroutine function taking a city code and returning its hotel list
+        path: SQLite file holding the directory
+        ttl: Seconds after which a listing is refreshed in the background
+        empty_ttl: Seconds an empty listing is kept
+    """
+
+    def __init__(self, afetch, path: str, ttl: float = 7 * 24 * 3600, empty_ttl: float = 300):
+        self._afetch = afetch
+        self.path = path
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._entries = {}
+        self._refreshing = set()
+        self._inflight = {}
+        self._tasks = set()
+        self._loop = None
+
+    def get(self, city_code: str, timeout: float = None):
+        """
+        Blocking `aget` for code running on other threads than the event loop
+        the directory is used on.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            raise RuntimeError("HotelDirectory.get needs the event loop that serves aget; call aget instead")
+        return asyncio.run_coroutine_threadsafe(self.aget(city_code), loop).result(timeout)
+
+    async def aget(self, city_code: str):
+        """
+        Return the hotel list for `city_code`, fetching it only if the city is unknown.
+
+        Concurrent lookups of the same unknown city share one fetch, which runs
+        in its own task so that a caller going away does not cancel it for the
+        others. SQLite reads and writes run on a worker thread.
+        """
+        self._loop = asyncio.get_running_loop()
+        city_code = city_code.strip().upper()
+        entry = self._entries.get(city_code)
+        if entry is None or self._unknown(entry):
+            entry = await asyncio.to_thread(self._entry, city_code)
+        if entry is None:
+            fetch = self._inflight.get(city_code)
+            if fetch is None:
+                fetch = self._inflight[city_code] = self._start(self.arefresh(city_code))
+                fetch.add_done_callback(lambda _: self._inflight.pop(city_code, None))
+            return await asyncio.shield(fetch)
+        if self._expired(entry):
+            self._refresh_in_background(city_code)
+        return entry[1]
+
+    async def arefresh(self, city_code: str):
+        """Fetch `city_code` from the upstream API and store it."""
+        city_code = city_code.strip().upper()
+        hotels = await self._afetch(city_code)
+        await asyncio.to_thread(self._store, city_code, hotels)
+        return hotels
+
+    def preload(self, city_codes):
+        """Fetch missing or stale cities in a background task; call from the event loop."""
+        async def run():
+            for city_code in city_codes:
+                city_code = city_code.strip().upper()
+                entry = await asyncio.to_thread(self._entry, city_code)
+                if entry is not None and not self._expired(entry):
+                    continue
+                try:
+                    await self.arefresh(city_code)
+                except Exception as e:
+                    logger.warning("Hotel directory preload failed for %s: %s", city_code, e)
+            logger.info("Hotel directory preloaded %d cities", len(city_codes))
+
+        city_codes = [code for code in city_codes if code.strip()]
+        if city_codes:
+            self._loop = asyncio.get_running_loop()
+            self._start(run())
+
+    def _start(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        # Retrieve the error so a fetch whose callers all went away does not log a warning
+        if not task.cancelled():
+            task.exception()
+
+    def _store(self, city_code, hotels):
+        fetched_at = time.time()
+        with self._db_lock, self._connection():
+            self._conn.execute(
+                'INSERT OR REPLACE INTO hotel_directory (city_code, hotels, fetched_at) VALUES (?, ?, ?)',
+                (city_code, json.dumps(hotels, separators=(',', ':')), fetched_at)
+            )
+        self._entries[city_code] = (fetched_at, hotels)
+
+    def _entry(self, city_code):
+        """The (fetched_at, hotels) listing of `city_code`, or None if it is unknown."""
+        entry = self._entries.get(city_code)
+        if entry is None:
+            with self._db_lock:
+                row = self._connection().execute(
+                    'SELECT fetched_at, hotels FROM hotel_directory WHERE city_code = ?', (city_code,)
+                ).fetchone()
+            if row is None:
+                return None
+            entry = self._entries[city_code] = (row[0], json.loads(row[1]))
+        return None if self._unknown(entry) else entry
+
+    def _unknown(self, entry):
+        # An old empty listing is likely a transient upstream gap; fetch it again
+        return not entry[1] and time.time() - entry[0] > self.empty_ttl
+
+    def _expired(self, entry):
+        return time.time() - entry[0] > self.ttl
+
+    def _connection(self):
+        """The SQLite connection, opened on first use; callers hold `_db_lock`."""
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS hotel_directory ('
+                    'city_code TEXT PRIMARY KEY, hotels TEXT NOT NULL, fetched_at REAL NOT NULL)'
+                )
+            self._conn = conn
+        return self._conn
+
+    def _refresh_in_background(self, city_code):
+        if city_code in self._refreshing:
+            return
+        self._refreshing.add(city_code)
+
+        async def run():
+            try:
+                await self.arefresh(city_code)
+            except Exception as e:
+                logger.warning("Hotel directory refresh failed for %s: %s", city_code, e)
+            finally:
+                self._refreshing.discard(city_code)
+
+        self._start(run())
+
+
+__all__ = ["HotelDirectory"]
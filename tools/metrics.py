@@ -0,0 +1,245 @@
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from cache hits up to slow browser scrapes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric family whose samples are keyed by label values."""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self):
+        """(name suffix, labels, value) for every sample of the family."""
+        with self._lock:
+            items = list(self._values.items())
+        return [('', self._labels(key), value) for key, value in items]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Count the enclosed block as in flight while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the enclosed block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, count))
+        return samples
+
+
+class Registry:
+    """
+    Metric families plus collectors, rendered in the Prometheus text format.
+
+    Collectors are callables invoked at scrape time that yield
+    (name, type, help, [(labels, value), ...]) for values that already live
+    elsewhere, such as cache statistics.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Re-registering a name (e.g. a reloaded module) returns the existing family
+            return self._metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def exposition(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Hot-path metrics shared across the tools
+TOOL_CALLS = counter('mcp_tool_calls_total', 'MCP tool calls by outcome', ('tool', 'status'))
+TOOL_LATENCY = histogram('mcp_tool_duration_seconds', 'MCP tool call latency', ('tool',))
+TOOL_IN_FLIGHT = gauge('mcp_tool_calls_in_flight', 'MCP tool calls currently running', ('tool',))
+AMADEUS_LATENCY = histogram('amadeus_request_duration_seconds', 'Amadeus HTTP request latency, excluding queueing',
+                            ('method', 'path', 'status'))
+AMADEUS_IN_FLIGHT = gauge('amadeus_requests_in_flight', 'Amadeus HTTP requests currently in flight')
+SEARCH_PHASE_LATENCY = histogram('google_search_phase_seconds', 'Chromium google_search time per phase', ('phase',))
+PDF_RENDER_LATENCY = histogram('pdf_render_seconds', 'Trip PDF render time, including pool dispatch', ('storage',))
+
+
+def cache_collector(caches: dict):
+    """
+    Collector exporting TTLCache statistics.
+
+    Args:
+        caches: Cache name -> callable returning that cache's stats() dict
+    """
+    fields = (
+        ('cache_hits_total', 'counter', 'Cache lookups answered from the cache', 'hits'),
+        ('cache_stale_hits_total', 'counter', 'Cache hits served stale while refreshing', 'stale_hits'),
+        ('cache_misses_total', 'counter', 'Cache lookups that had to load the value', 'misses'),
+        ('cache_coalesced_total', 'counter', 'Loads that joined an identical load already in flight', 'coalesced'),
+        ('cache_evictions_total', 'counter', 'Entries evicted to respect the size limits', 'evictions'),
+        ('cache_entries', 'gauge', 'Entries currently cached', 'size'),
+        ('cache_hit_ratio', 'gauge', 'Hits divided by lookups since startup', 'hit_ratio'),
+    )
+
+    def collect():
+        stats = {name: get_stats() for name, get_stats in caches.items()}
+        for metric, kind, documentation, field in fields:
+            yield metric, kind, documentation, [({'cache': name}, values[field]) for name, values in stats.items()]
+    return collect
+
+
+def scheduler_collector(get_stats):
+    """Collector exporting the Amadeus RequestScheduler counters from `get_stats()`."""
+    def collect():
+        stats = get_stats()
+        yield 'amadeus_scheduler_queued', 'gauge', 'Amadeus requests waiting for a rate-limit slot', [({}, stats['queued'])]
+        yield 'amadeus_scheduler_granted_total', 'counter', 'Rate-limit slots granted', [({}, stats['granted'])]
+        yield ('amadeus_throttled_responses_total', 'counter', 'Amadeus 429 responses received',
+               [({}, stats['throttled_responses'])])
+        yield ('amadeus_deadline_exceeded_total', 'counter', 'Amadeus requests that gave up waiting for a slot',
+               [({}, stats['deadline_exceeded'])])
+    return collect
+
+
+def render_metrics() -> str:
+    return REGISTRY.exposition()
+
+
+__all__ = ["Counter", "Gauge", "Histogram", "Registry", "REGISTRY", "CONTENT_TYPE", "counter", "gauge", "histogram",
+           "TOOL_CALLS", "TOOL_LATENCY", "TOOL_IN_FLIGHT", "AMADEUS_LATENCY", "AMADEUS_IN_FLIGHT",
+           "SEARCH_PHASE_LATENCY", "PDF_RENDER_LATENCY", "cache_collector",
+           "scheduler_collector", "render_metrics"]
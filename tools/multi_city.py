@@ -0,0 +1,139 @@
+import asyncio
+import math
+import os
+import re
+from tools.flight_ranking import rank_offers
+from tools.search_flights import (FLIGHT_FETCH_LIMIT, RANK_WEIGHTS, async_fetch_flight_offers, build_travelers,
+                                  async_render_flight_offers)
+
+# Amadeus accepts at most six originDestinations per flight-offers request
+MAX_LEGS_PER_REQUEST = int(os.getenv('FLIGHT_MAX_LEGS_PER_REQUEST', '6'))
+
+_LEG_RE = re.compile(r'([A-Za-z]{3})\s*-\s*([A-Za-z]{3})')
+
+
+def parse_legs(legs_str: str, dates_str: str):
+    """
+    Parse "TPE-NYC,NYC-ORD,ORD-TPE" and one departure date per leg into
+    [(origin, destination, date), ...].
+    """
+    legs = [leg.strip() for leg in legs_str.split(',') if leg.strip()]
+    dates = [day.strip() for day in dates_str.split(',') if day.strip()]
+    if not legs:
+        raise ValueError("At least one leg is required, e.g. 'TPE-NYC,NYC-TPE'")
+    if len(legs) != len(dates):
+        raise ValueError(f"Got {len(legs)} legs but {len(dates)} dates; give one departure date per leg")
+    parsed = []
+    for leg, day in zip(legs, dates):
+        match = _LEG_RE.fullmatch(leg)
+        if not match:
+            raise ValueError(f"Leg {leg!r} is not of the form ORIGIN-DESTINATION (IATA codes)")
+        parsed.append((match.group(1).upper(), match.group(2).upper(), day))
+    if any(later[2] < earlier[2] for earlier, later in zip(parsed, parsed[1:])):
+        raise ValueError("Leg dates must be in chronological order")
+    return parsed
+
+
+def build_multi_city_body(legs, infant_count: int, child_count: int, adult_count: int, max_offers: int = None):
+    """Flight-offers POST body with one originDestination per leg."""
+    return {
+        'currencyCode': 'USD',
+        'originDestinations': [{'id': str(i),
+                                'originLocationCode': origin,
+                                'destinationLocationCode': destination,
+                                'departureDateTimeRange': {'date': day, 'time': '00:00:00'}}
+                               for i, (origin, destination, day) in enumerate(legs, 1)],
+        'travelers': build_travelers(infant_count, child_count, adult_count),
+        'sources': ['GDS'],
+        'searchCriteria': {'maxFlightOffers': max_offers or FLIGHT_FETCH_LIMIT}
+    }
+
+
+def split_legs(legs, max_legs: int = MAX_LEGS_PER_REQUEST):
+    """Split legs into the fewest consecutive chunks of at most `max_legs`, balanced in size."""
+    chunks = math.ceil(len(legs) / max_legs)
+    size, extra = divmod(len(legs), chunks)
+    result, start = [], 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        result.append(legs[start:end])
+        start = end
+    return result
+
+
+def merge_traveler_pricings(parts):
+    """
+    Join the travelerPricings of consecutive chunk offers: per traveler, the
+    fare details of every chunk's segments in trip order. None when a chunk
+    has no pricings or prices a different set of travelers.
+    """
+    pricings = [part.get('travelerPricings') for part in parts]
+    travelers = [[pricing.get('travelerId') for pricing in chunk] for chunk in pricings if chunk]
+    if len(travelers) != len(parts) or any(sorted(ids) != sorted(travelers[0]) for ids in travelers):
+        return None
+    merged = {}
+    for chunk in pricings:
+        for pricing in chunk:
+            entry = merged.setdefault(pricing.get('travelerId'), dict(pricing, fareDetailsBySegment=[]))
+            entry['fareDetailsBySegment'] = entry['fareDetailsBySegment'] + pricing.get('fareDetailsBySegment', [])
+    return list(merged.values())
+
+
+def merge_chunk_offers(chunk_offers):
+    """
+    Combine the offers of consecutive leg chunks into whole-trip offers.
+
+    Each chunk's offers are ranked, and the n-th best offers of every chunk are
+    joined into the n-th combined offer: itineraries and per-segment fare
+    details are concatenated, prices added, and seats/ticketing deadlines take
+    the most restrictive value. Fields no chunk reports are left out.
+    """
+    ranked = [rank_offers(offers, RANK_WEIGHTS, limit=len(offers)) for offers in chunk_offers]
+    merged = []
+    for n, parts in enumerate(zip(*ranked), 1):
+        total = sum(float(part['price']['total']) for part in parts)
+        offer = {
+            'type': 'flight-offer',
+            'id': f'M{n}',
+            'source': parts[0].get('source', 'GDS'),
+            'itineraries': [itinerary for part in parts for itinerary in part['itineraries']],
+            'price': {'currency': parts[0]['price'].get('currency'), 'total': f'{total:.2f}'},
+        }
+        for field in ('lastTicketingDate', 'numberOfBookableSeats'):
+            values = [part[field] for part in parts if part.get(field) is not None]
+            if values:
+                offer[field] = min(values)
+        traveler_pricings = merge_traveler_pricings(parts)
+        if traveler_pricings is not None:
+            offer['travelerPricings'] = traveler_pricings
+        merged.append(offer)
+    return merged
+
+
+async def async_search_multi_city(legs_str: str, dates_str: str,
+                                  infant_count: int, child_count: int, adult_count: int,
+                                  output_format: str = 'text', fields: str = None,
+                                  limit: int = None, offset: int = 0, on_result=None):
+    """
+    Search one multi-city itinerary with N legs.
+
+    Up to MAX_LEGS_PER_REQUEST legs go out as a single flight-offers request.
+    Longer routes are split into balanced chunks that are searched in parallel
+    (each through the flight cache) and merged into whole-trip offers.
+
+    Returns:
+        str: Ranked offers rendered like search_flights; `on_result` streams
+        the text summary as in async_search_flights
+    """
+    legs = parse_legs(legs_str, dates_str)
+    bodies = [build_multi_city_body(chunk, infant_count, child_count, adult_count)
+              for chunk in split_legs(legs)]
+    chunk_offers = await asyncio.gather(*(async_fetch_flight_offers(body) for body in bodies))
+    offers = chunk_offers[0] if len(bodies) == 1 else merge_chunk_offers(chunk_offers)
+    return await async_render_flight_offers(offers, output_format, fields, limit, offset,
+                                            legs=[f'{origin}-{destination}' for origin, destination, _ in legs],
+                                            tool='search_multi_city_flights', on_result=on_result)
+
+
+__all__ = ["async_search_multi_city", "parse_legs", "build_multi_city_body", "split_legs", "merge_chunk_offers",
+           "merge_traveler_pricings"]
@@ -0,0 +1,127 @@
+from collections import namedtuple
+import asyncio
+import json
+import logging
+import time
+from tools.google_search import RESULTS_HEADER, async_google_search
+from tools.search_flights import OUTPUT_FORMATS, async_search_flights, dumps_compact
+from tools.search_hotels import async_trip_hotel_outcomes
+from tools.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Result of a part that succeeded only for some of its items; `failed` names the others
+PartialResult = namedtuple('PartialResult', ['result', 'failed'])
+
+
+async def _timed_part(name: str, coroutine, on_result=None, total: int = None):
+    """
+    Await one part of the plan and record how it went.
+
+    Returns:
+        dict: name, status ('ok', 'partial' or 'error'), elapsed_ms and either
+        result or error; a partial part also lists what `failed`
+    """
+    start = time.perf_counter()
+    try:
+        with span('plan_trip.part', part=name):
+            result = await coroutine
+        if isinstance(result, PartialResult):
+            part = {'name': name, 'status': 'partial', 'result': result.result, 'failed': result.failed}
+        else:
+            part = {'name': name, 'status': 'ok', 'result': result}
+    except Exception as error:
+        logger.warning("plan_trip part %s failed: %s", name, error)
+        part = {'name': name, 'status': 'error', 'error': f"{type(error).__name__}: {error}"}
+    part['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    if on_result is not None:
+        await on_result(format_part(part), total)
+    return part
+
+
+async def _search(query: str):
+    # google_search reports failures as text; surface them as a failed part
+    result = await async_google_search(query)
+    if not result.startswith(RESULTS_HEADER):
+        raise RuntimeError(result)
+    return result
+
+
+async def _trip_hotels(city_codes_str: str, orig_date: str, dest_dates_str: str, adults: int):
+    # A city's failure is rendered into the text; report it in the part status as well
+    outcomes = await async_trip_hotel_outcomes(city_codes_str, orig_date, dest_dates_str, adults)
+    failed = [leg[0] for leg, error, _ in outcomes if error is not None]
+    if failed and len(failed) == len(outcomes):
+        raise RuntimeError('; '.join(f"{leg[0]}: {error}" for leg, error, _ in outcomes))
+    text = ''.join(block for _, _, block in outcomes)
+    return PartialResult(text, failed) if failed else text
+
+
+async def _flights_json(*args):
+    # Embedded as an object, not as a JSON string inside the JSON result
+    return json.loads(await async_search_flights(*args, output_format='json'))
+
+
+async def async_plan_trip(orig_location_code: str, orig_date: str, dest_cities_str: str, dest_dates_str: str,
+                          infant_count: int, child_count: int, adult_count: int,
+                          search_queries=None, output_format: str = 'text', on_result=None):
+    """
+    Search flights, hotels for every destination and any Google queries for a trip at once.
+
+    Mirrors the workflow's sequential calls: the flight search flies out to the
+    first destination and back from the last one on its date, and hotels cover
+    each destination from `orig_date` through `dest_dates_str`. All parts run
+    concurrently, so the call takes as long as the slowest part. A failing part
+    is reported with its error while the others are still returned; hotels are
+    'partial' when only some cities failed, listing them in `failed`.
+    `on_result(block, total)` receives each part as soon as it finishes.
+
+    Returns:
+        str: One markdown section per part plus a timing table, or compact
+        JSON ({"parts": [...], "elapsed_ms": ...}) with output_format='json'
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+    dest_cities = [city.strip() for city in dest_cities_str.split(',') if city.strip()]
+    dest_dates = [day.strip() for day in dest_dates_str.split(',') if day.strip()]
+    if not dest_cities or len(dest_cities) != len(dest_dates):
+        raise ValueError("Give one date in dest_dates_str for every city in dest_cities_str")
+    queries = [query for query in (search_queries or []) if query and query.strip()]
+
+    flight_search = async_search_flights if output_format == 'text' else _flights_json
+    parts = [
+        ('flights', flight_search(orig_location_code, dest_cities[0], dest_cities[-1],
+                                  orig_date, dest_dates[-1], infant_count, child_count, adult_count)),
+        ('hotels', _trip_hotels(','.join(dest_cities), orig_date, ','.join(dest_dates), adult_count)),
+    ]
+    parts += [(f'search: {query}', _search(query)) for query in queries]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_timed_part(name, coroutine, on_result, len(parts))
+                                     for name, coroutine in parts))
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    if output_format == 'json':
+        return dumps_compact({'parts': results, 'elapsed_ms': elapsed_ms})
+    return ''.join(format_part(part) for part in results) + format_timings(results, elapsed_ms)
+
+
+def format_part(part) -> str:
+    """Markdown section for one part of the plan."""
+    if part['status'] == 'error':
+        body = f"{part['name']} failed: {part['error']}\n"
+    else:
+        body = part['result'] if isinstance(part['result'], str) else dumps_compact(part['result'])
+        if part['status'] == 'partial':
+            body = body.rstrip() + f"\n\n{part['name']} partially failed for: {', '.join(part['failed'])}\n"
+    return f"## {part['name']}\n{body.rstrip()}\n\n"
+
+
+def format_timings(parts, elapsed_ms: float) -> str:
+    lines = ["## Timings", "| part | status | ms |", "|---|---|---|"]
+    lines += [f"| {part['name']} | {part['status']} | {part['elapsed_ms']:.0f} |" for part in parts]
+    lines.append(f"| total (concurrent) | - | {elapsed_ms:.0f} |")
+    return '\n'.join(lines) + '\n'
+
+
+__all__ = ["PartialResult", "async_plan_trip", "format_part", "format_timings"]
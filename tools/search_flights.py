@@ -1,14 +1,197 @@
 from amadeus import Client, Location, ResponseError
 from dotenv import load_dotenv
+import hashlib
+import logging
 import os
 import pprint
 import json
 import pickle
-from datetime import datetime
+from array import array
+from datetime import datetime, timedelta, timezone
+from tools.amadeus_client import AmadeusAPIError, get_async_client, get_sync_client
+from tools.amadeus_scheduler import Priority, call_with_rate_limit_retry
+from tools.cache import TTLCache
+from tools.flight_ranking import rank_offers, rank_weights_from_env
+from tools.tracing import span, traced
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 load_dotenv()
 
-amadeus = Client()
+logger = logging.getLogger(__name__)
+
+amadeus = get_sync_client()
+
+# Raw flight-offers responses keyed on the canonical request body
+flight_cache = TTLCache(
+    maxsize=int(os.getenv('FLIGHT_CACHE_SIZE', '128')),
+    ttl=float(os.getenv('FLIGHT_CACHE_TTL', '300')),
+    stale_ttl=float(os.getenv('FLIGHT_CACHE_STALE_TTL', '0')),
+    max_bytes=int(os.getenv('FLIGHT_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    weigher=lambda data: len(json.dumps(data)),
+    sqlite_path=os.getenv('SHARED_CACHE_DB') or None,
+    namespace='flight_offers'
+)
+
+def flight_search_key(body):
+    """
+    Canonical cache key for a flight-offers request body.
+    Covers route legs, dates, traveler mix, cabin and search criteria.
+    """
+    canonical = json.dumps(body, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+OUTPUT_FORMATS = ('text', 'json')
+# Offers requested from the API (Amadeus allows up to 250); ranking picks the best of them
+FLIGHT_FETCH_LIMIT = int(os.getenv('FLIGHT_FETCH_LIMIT', '50'))
+# Offers returned per page when the caller does not ask for a number
+FLIGHT_TOP_K = int(os.getenv('FLIGHT_TOP_K', '4'))
+RANK_WEIGHTS = rank_weights_from_env()
+# Top-level fields of a pruned flight offer, selectable in JSON output
+FLIGHT_OFFER_FIELDS = ('id', 'price', 'lastTicketingDate', 'numberOfBookableSeats', 'itineraries', 'cabin', 'includedBags',
+                       'includedBagWeight')
+
+def flight_cache_stats():
+    """Hit/miss counters of the flight offer cache."""
+    return flight_cache.stats()
+
+def dumps_compact(obj) -> str:
+    """Compact JSON without whitespace; uses orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+def parse_fields(fields: str):
+    """
+    Parse a comma-separated field selection such as "id,price,itineraries".
+
+    Returns:
+        tuple: Selected fields in request order, or None to keep every field
+    """
+    selected = tuple(dict.fromkeys(field.strip() for field in (fields or '').split(',') if field.strip()))
+    unknown = [field for field in selected if field not in FLIGHT_OFFER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown flight fields {unknown}; choose from {', '.join(FLIGHT_OFFER_FIELDS)}")
+    return selected or None
+
+def flight_offers_json(flight_data, fields=None, total: int = None, offset: int = 0) -> str:
+    """
+    Structured result: pruned flight offers restricted to `fields`, as compact JSON.
+    With `total` set, the offers are one page of a ranking and paging metadata is added.
+    """
+    offers = prune_flight_offers(flight_data)
+    if fields:
+        offers = [{field: offer[field] for field in fields if field in offer} for offer in offers]
+    result = {'offers': offers}
+    if total is not None:
+        next_offset = offset + len(offers)
+        result.update(total=total, offset=offset, next_offset=next_offset if next_offset < total else None)
+    return dumps_compact(result)
+
+def paging_note(total: int, offset: int, count: int, tool: str = 'search_flights') -> str:
+    """Footer telling the caller how to fetch the next page of the text summary."""
+    if total == 0:
+        return "\nNo flight offers found for this search.\n"
+    if count == 0:
+        return f"\nNo more flight options; all {total} have been shown.\n"
+    if offset + count >= total:
+        return ""
+    return (f"\nShowing flight options {offset + 1}-{offset + count} of {total}. "
+            f"Call {tool} again with offset={offset + count} to see more.\n")
+
+@traced('render_flight_offers')
+def render_flight_offers(flight_data, output_format: str = 'text', fields: str = None,
+                         limit: int = None, offset: int = 0, legs=None, tool: str = 'search_flights') -> str:
+    """
+    Rank flight offers and render the best `limit` from `offset`, as the markdown
+    summary or, with output_format='json', as structured JSON. `legs` names the
+    itineraries of a multi-city search in the summary (e.g. ['TPE-NYC', 'NYC-ORD']).
+    Both are rendered from the offers in the flight cache, so the text and JSON
+    pages of a search always describe the same upstream response.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+    limit = limit or FLIGHT_TOP_K
+    if output_format == 'text':
+        return ''.join(flight_text_blocks(flight_data, limit, offset, legs, tool))
+    return flight_json_page(flight_data, parse_fields(fields), limit, offset)
+
+def flight_json_page(flight_data, selected, limit: int, offset: int) -> str:
+    """The JSON result for one ranked page of offers."""
+    page = rank_offers(flight_data, RANK_WEIGHTS, limit=limit, offset=offset)
+    return flight_offers_json(page, selected, total=len(flight_data), offset=offset)
+
+def flight_text_blocks(flight_data, limit: int, offset: int = 0, legs=None, tool: str = 'search_flights'):
+    """The text summary as a list of blocks: one per ranked flight option, then the paging note."""
+    page = rank_offers(flight_data, RANK_WEIGHTS, limit=limit, offset=offset)
+    flights = parse_flight_data_batch(page)
+    if legs:
+        flights = label_legs(flights, legs)
+    blocks = list(flight_option_blocks(flights, start=offset + 1))
+    note = paging_note(len(flight_data), offset, len(page), tool)
+    return blocks + [note] if note else blocks
+
+async def async_render_flight_offers(flight_data, output_format: str = 'text', fields: str = None,
+                                     limit: int = None, offset: int = 0, legs=None, tool: str = 'search_flights',
+                                     on_result=None) -> str:
+    """
+    render_flight_offers that also passes each text block to the async
+    callback `on_result(block, total)` as it is rendered, for streaming.
+    """
+    if on_result is None or output_format != 'text':
+        return render_flight_offers(flight_data, output_format, fields, limit, offset, legs, tool)
+    with span('render_flight_offers', offers=len(flight_data)):
+        blocks = flight_text_blocks(flight_data, limit or FLIGHT_TOP_K, offset, legs, tool)
+    for block in blocks:
+        await on_result(block, len(blocks))
+    return ''.join(blocks)
+
+def _parse_duration(duration_str):
+    """Convert ISO 8601 duration to human readable format"""
+    if not duration_str:
+        return "N/A"
+
+    # Remove PT prefix and parse
+    duration_str = duration_str.replace('PT', '')
+    hours = 0
+    minutes = 0
+
+    if 'H' in duration_str:
+        hours_part = duration_str.split('H')[0]
+        hours = int(hours_part)
+        duration_str = duration_str.split('H')[1] if 'H' in duration_str else duration_str
+
+    if 'M' in duration_str:
+        minutes_part = duration_str.replace('M', '')
+        if minutes_part:
+            minutes = int(minutes_part)
+
+    return f"{hours}h {minutes}m"
+
+def _calculate_layover(arrival_time, departure_time):
+    """Calculate layover time between flights"""
+    try:
+        arrival = datetime.fromisoformat(arrival_time.replace('Z', '+00:00'))
+        departure = datetime.fromisoformat(departure_time.replace('Z', '+00:00'))
+        layover = departure - arrival
+
+        hours = layover.seconds // 3600
+        minutes = (layover.seconds % 3600) // 60
+
+        return f"{hours}h {minutes}m"
+    except:
+        return "N/A"
+
+def _format_datetime(dt_str):
+    """Format datetime string to readable format"""
+    try:
+        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+        return dt.strftime('%Y-%m-%d %H:%M')
+    except:
+        return dt_str
 
 def parse_flight_data(flight_data):
     """
@@ -20,51 +203,7 @@ def parse_flight_data(flight_data):
     Returns:
         list: Array of dictionaries with formatted flight details
     """
-    
-    def parse_duration(duration_str):
-        """Convert ISO 8601 duration to human readable format"""
-        if not duration_str:
-            return "N/A"
-        
-        # Remove PT prefix and parse
-        duration_str = duration_str.replace('PT', '')
-        hours = 0
-        minutes = 0
-        
-        if 'H' in duration_str:
-            hours_part = duration_str.split('H')[0]
-            hours = int(hours_part)
-            duration_str = duration_str.split('H')[1] if 'H' in duration_str else duration_str
-        
-        if 'M' in duration_str:
-            minutes_part = duration_str.replace('M', '')
-            if minutes_part:
-                minutes = int(minutes_part)
-        
-        return f"{hours}h {minutes}m"
-    
-    def calculate_layover(arrival_time, departure_time):
-        """Calculate layover time between flights"""
-        try:
-            arrival = datetime.fromisoformat(arrival_time.replace('Z', '+00:00'))
-            departure = datetime.fromisoformat(departure_time.replace('Z', '+00:00'))
-            layover = departure - arrival
-            
-            hours = layover.seconds // 3600
-            minutes = (layover.seconds % 3600) // 60
-            
-            return f"{hours}h {minutes}m"
-        except:
-            return "N/A"
-    
-    def format_datetime(dt_str):
-        """Format datetime string to readable format"""
-        try:
-            dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-            return dt.strftime('%Y-%m-%d %H:%M')
-        except:
-            return dt_str
-    
+
     try:
         # Parse JSON data
         # flight_data = json.loads(flight_json_string)
@@ -104,7 +243,7 @@ def parse_flight_data(flight_data):
             
             for itinerary_idx, itinerary in enumerate(itineraries):
                 segments = itinerary.get('segments', [])
-                itinerary_duration = parse_duration(itinerary.get('duration', ''))
+                itinerary_duration = _parse_duration(itinerary.get('duration', ''))
                 total_flight_duration.append(itinerary_duration)
                 
                 # Add itinerary header
@@ -119,16 +258,16 @@ def parse_flight_data(flight_data):
                     carrier_code = segment.get('carrierCode', 'N/A')
                     flight_number = segment.get('number', 'N/A')
                     aircraft_code = segment.get('aircraft', {}).get('code', 'N/A')
-                    segment_duration = parse_duration(segment.get('duration', ''))
+                    segment_duration = _parse_duration(segment.get('duration', ''))
                     
                     # Format segment information
                     dep_airport = departure.get('iataCode', 'N/A')
                     dep_terminal = departure.get('terminal', '')
-                    dep_time = format_datetime(departure.get('at', ''))
+                    dep_time = _format_datetime(departure.get('at', ''))
                     
                     arr_airport = arrival.get('iataCode', 'N/A')
                     arr_terminal = arrival.get('terminal', '')
-                    arr_time = format_datetime(arrival.get('at', ''))
+                    arr_time = _format_datetime(arrival.get('at', ''))
                     
                     # Build segment string
                     segment_info = f"{dep_airport}"
@@ -146,7 +285,7 @@ def parse_flight_data(flight_data):
                     # Calculate layover time if not the last segment in this itinerary
                     if segment_idx < len(segments) - 1:
                         next_segment = segments[segment_idx + 1]
-                        layover_time = calculate_layover(
+                        layover_time = _calculate_layover(
                             arrival.get('at', ''),
                             next_segment.get('departure', {}).get('at', '')
                         )
@@ -179,40 +318,221 @@ def parse_flight_data(flight_data):
         return [{'error': f'Error parsing flight data: {str(e)}'}]
 
 
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# Sentinel in the epoch column for timestamps that do not parse
+_INVALID_TIME = -(2 ** 63)
+
+def _parse_times(values):
+    """
+    Parse each distinct timestamp once.
+
+    Returns:
+        dict: value -> (formatted as _format_datetime does, epoch microseconds, kind)
+        where kind is 0 for naive, 1 for UTC-offset and -1 for unparseable times
+    """
+    parsed = {}
+    for value in values:
+        if value in parsed:
+            continue
+        try:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except Exception:
+            parsed[value] = (value, _INVALID_TIME, -1)
+            continue
+        if dt.tzinfo is None:
+            # Plain YYYY-MM-DDTHH:MM[:SS] (validated above) formats by slicing, skipping strftime
+            if len(value) in (16, 19) and value[10] == 'T':
+                formatted = f"{value[:10]} {value[11:16]}"
+            else:
+                formatted = dt.strftime('%Y-%m-%d %H:%M')
+            parsed[value] = (formatted, (dt - _EPOCH) // _MICROSECOND, 0)
+        else:
+            parsed[value] = (dt.strftime('%Y-%m-%d %H:%M'), (dt - _EPOCH_UTC) // _MICROSECOND, 1)
+    return parsed
+
+def _layovers(arrival_us, arrival_kind, departure_us, departure_kind):
+    """Bulk layover strings for (arrival, next departure) column pairs, matching _calculate_layover."""
+    layovers = []
+    for arrival, a_kind, departure, d_kind in zip(arrival_us, arrival_kind, departure_us, departure_kind):
+        # Unparseable times, and naive minus aware (TypeError), give N/A
+        if a_kind < 0 or a_kind != d_kind:
+            layovers.append("N/A")
+            continue
+        # timedelta.seconds: the seconds component after normalizing to days + seconds
+        seconds = ((departure - arrival) // 1_000_000) % 86400
+        layovers.append(f"{seconds // 3600}h {(seconds % 3600) // 60}m")
+    return layovers
+
+def parse_flight_data_batch(flight_data):
+    """
+    Batch version of parse_flight_data for large result sets, with identical output.
+
+    Segments of all offers are flattened into columns. Every distinct timestamp
+    and duration is parsed once, and layovers are computed in one pass over
+    epoch-microsecond arrays. Input the fast path does not handle falls back
+    to parse_flight_data, so errors are reported exactly as before.
+
+    Args:
+        flight_data: Flight offers as returned by the flight-offers API
+
+    Returns:
+        list: Array of dictionaries with formatted flight details
+    """
+    if not isinstance(flight_data, list):
+        flight_data = [flight_data]
+    try:
+        return _parse_flights_columnar(flight_data)
+    except Exception:
+        return parse_flight_data(flight_data)
+
+def _parse_flights_columnar(flight_data):
+    offers = []
+    # Segment columns
+    dep_at, arr_at, seg_duration, flight_labels, aircraft_codes = [], [], [], [], []
+    dep_places, arr_places = [], []
+    # Index of each segment followed by a connection in the same itinerary
+    layover_pairs = []
+
+    for flight_offer in flight_data:
+        price_info = flight_offer.get('price', {})
+        traveler_pricing = flight_offer.get('travelerPricings', [{}])[0]
+        fare_details = traveler_pricing.get('fareDetailsBySegment', [])
+        itineraries = []
+        for itinerary in flight_offer.get('itineraries', []):
+            segments = itinerary.get('segments', [])
+            first = len(dep_at)
+            for segment in segments:
+                departure = segment.get('departure', {})
+                arrival = segment.get('arrival', {})
+                dep_at.append(departure.get('at', ''))
+                arr_at.append(arrival.get('at', ''))
+                seg_duration.append(segment.get('duration', ''))
+                flight_labels.append(f"{segment.get('carrierCode', 'N/A')}{segment.get('number', 'N/A')}")
+                aircraft_codes.append(segment.get('aircraft', {}).get('code', 'N/A'))
+                dep_places.append((departure.get('iataCode', 'N/A'), departure.get('terminal', '')))
+                arr_places.append((arrival.get('iataCode', 'N/A'), arrival.get('terminal', '')))
+            layover_pairs.extend(range(first, len(dep_at) - 1))
+            itineraries.append((itinerary.get('duration', ''), first, len(dep_at)))
+        offers.append((
+            flight_offer.get('id', 'N/A'),
+            price_info.get('total', 'N/A'),
+            price_info.get('currency', 'N/A'),
+            fare_details[0].get('cabin', 'N/A') if fare_details else 'N/A',
+            fare_details[0].get('includedCheckedBags', {}).get('quantity', 0) if fare_details else 0,
+            fare_details[0].get('includedCabinBags', {}).get('quantity', 0) if fare_details else 0,
+            itineraries,
+        ))
+
+    # Bulk conversions over the columns
+    durations = {value: _parse_duration(value)
+                 for value in dict.fromkeys(seg_duration + [it[0] for offer in offers for it in offer[6]])}
+    times = _parse_times(dep_at + arr_at)
+    dep_us = array('q', [times[value][1] for value in dep_at])
+    dep_kind = array('b', [times[value][2] for value in dep_at])
+    arr_us = array('q', [times[value][1] for value in arr_at])
+    arr_kind = array('b', [times[value][2] for value in arr_at])
+    layovers = _layovers(
+        [arr_us[i] for i in layover_pairs], [arr_kind[i] for i in layover_pairs],
+        [dep_us[i + 1] for i in layover_pairs], [dep_kind[i + 1] for i in layover_pairs],
+    )
+    places = {place: (f"{place[0]} (T{place[1]})" if place[1] else f"{place[0]}")
+              for place in dict.fromkeys(dep_places + arr_places)}
+    # Each segment's itinerary lines: the segment itself, then its layover if any
+    segment_lines = [
+        [f"{places[dep_place]} {times[dep][0]} -> {places[arr_place]} {times[arr][0]} | {label} | {durations[duration]}"]
+        for dep_place, dep, arr_place, arr, label, duration
+        in zip(dep_places, dep_at, arr_places, arr_at, flight_labels, seg_duration)
+    ]
+    for i, layover in zip(layover_pairs, layovers):
+        segment_lines[i].append(f"Layover: {layover}")
+
+    parsed_flights = []
+    for flight_id, total_price, currency, cabin_class, checked_bags, cabin_bags, itineraries in offers:
+        all_detailed_itinerary = []
+        total_flight_duration = []
+        for itinerary_idx, (duration, first, last) in enumerate(itineraries):
+            itinerary_duration = durations[duration]
+            total_flight_duration.append(itinerary_duration)
+            itinerary_type = 'Outbound' if itinerary_idx == 0 else 'Return'
+            all_detailed_itinerary.append(f"--- {itinerary_type} ({itinerary_duration}) ---")
+            for lines in segment_lines[first:last]:
+                all_detailed_itinerary.extend(lines)
+            if itinerary_idx < len(itineraries) - 1:
+                all_detailed_itinerary.append("")
+        offer_first = itineraries[0][1] if itineraries else 0
+        offer_last = itineraries[-1][2] if itineraries else 0
+        parsed_flights.append({
+            'flight_id': flight_id,
+            'total_price': total_price,
+            'currency': currency,
+            'flight_duration': ' + '.join(total_flight_duration),
+            'airline_flight_numbers': ', '.join(flight_labels[offer_first:offer_last]),
+            'aircraft_types': ', '.join(set(aircraft_codes[offer_first:offer_last])),  # Remove duplicates
+            'cabin_class': cabin_class,
+            'baggage_allowance': f"Checked: {checked_bags}, Cabin: {cabin_bags}",
+            'detailed_itinerary': all_detailed_itinerary
+        })
+    return parsed_flights
+
+def label_legs(flights, legs):
+    """Replace the Outbound/Return itinerary headers of parsed flights with numbered leg names."""
+    labelled = []
+    for flight in flights:
+        if 'error' in flight:
+            labelled.append(flight)
+            continue
+        itinerary, leg = [], 0
+        for line in flight['detailed_itinerary']:
+            if line.startswith('--- ') and line.endswith(' ---') and leg < len(legs):
+                duration = line[line.index('(') + 1:line.rindex(')')]
+                line = f"--- Leg {leg + 1}: {legs[leg]} ({duration}) ---"
+                leg += 1
+            itinerary.append(line)
+        labelled.append({**flight, 'detailed_itinerary': itinerary})
+    return labelled
+
 # Example usage function
-def flight_summary(flights):
-    """Return a formatted summary of parsed flights"""
-    ret = ""
-    for i, flight in enumerate(flights, 1):
+def flight_summary(flights, start: int = 1):
+    """Return a formatted summary of parsed flights, numbering options from `start`"""
+    return ''.join(flight_option_blocks(flights, start))
+
+def flight_option_blocks(flights, start: int = 1):
+    """Yield the summary text of each parsed flight, numbering options from `start`"""
+    for i, flight in enumerate(flights, start):
         if 'error' in flight:
-            print(f"Error: {flight['error']}")
+            logger.warning("Error: %s", flight['error'])
             continue
-            
-        ret += (f"\n # --- Flight Option {i} ---\n")
-        ret += (f"Flight ID: {flight['flight_id']}\n")
-        ret += (f"Price: {flight['total_price']} {flight['currency']}\n")
-        ret += (f"Duration: {flight['flight_duration']}\n")
-        ret += (f"Airlines/Flights: {flight['airline_flight_numbers']}\n")
-        ret += (f"Aircraft: {flight['aircraft_types']}\n")
-        ret += (f"Cabin: {flight['cabin_class']}\n")
-        ret += (f"Baggage: {flight['baggage_allowance']}\n")
-        ret += (" ## Itinerary:\n")
+        lines = []
+        write = lines.append
+        write(f"\n # --- Flight Option {i} ---")
+        write(f"Flight ID: {flight['flight_id']}")
+        write(f"Price: {flight['total_price']} {flight['currency']}")
+        write(f"Duration: {flight['flight_duration']}")
+        write(f"Airlines/Flights: {flight['airline_flight_numbers']}")
+        write(f"Aircraft: {flight['aircraft_types']}")
+        write(f"Cabin: {flight['cabin_class']}")
+        write(f"Baggage: {flight['baggage_allowance']}")
+        write(" ## Itinerary:")
         for segment in flight['detailed_itinerary']:
             if segment.startswith('---'):
-                ret += (f"  ### {segment}\n")
+                write(f"  ### {segment}")
             elif segment.startswith('Layover:'):
-                ret += (f"    {segment}\n")
+                write(f"    {segment}")
             elif segment == "":
-                ret += ("\n")
+                write("")
             else:
-                ret += (f"    - {segment}\n")
-    return ret
+                write(f"    - {segment}")
+        # Every line is newline-terminated
+        yield '\n'.join(lines) + '\n'
 
 def prune_flight_offers(flight_data):
     """
     Prunes flight offer data to include only customer-relevant information for decision making.
     Keeps: id, route, times, duration, price, cabin class, airline, aircraft, baggage
     Removes: technical fields, fare codes, segment IDs, etc.
+    Optional fields missing from an offer are None.
     """
     
     pruned_offers = []
@@ -222,17 +542,17 @@ def prune_flight_offers(flight_data):
             'id': offer['id'],
             'price': {
                 'total': offer['price']['total'],
-                'currency': offer['price']['currency']
+                'currency': offer['price'].get('currency')
             },
-            'lastTicketingDate': offer['lastTicketingDate'],
-            'numberOfBookableSeats': offer['numberOfBookableSeats'],
+            'lastTicketingDate': offer.get('lastTicketingDate'),
+            'numberOfBookableSeats': offer.get('numberOfBookableSeats'),
             'itineraries': []
         }
         
         # Process each itinerary
         for itinerary in offer['itineraries']:
             pruned_itinerary = {
-                'duration': itinerary['duration'],
+                'duration': itinerary.get('duration'),
                 'segments': []
             }
             
@@ -249,27 +569,30 @@ def prune_flight_offers(flight_data):
                     },
                     'airline': segment['carrierCode'],
                     'flightNumber': segment['number'],
-                    'aircraft': segment['aircraft']['code'],
-                    'duration': segment['duration'],
-                    'stops': segment['numberOfStops']
+                    'aircraft': segment.get('aircraft', {}).get('code'),
+                    'duration': segment.get('duration'),
+                    'stops': segment.get('numberOfStops')
                 }
                 pruned_itinerary['segments'].append(pruned_segment)
             
             pruned_offer['itineraries'].append(pruned_itinerary)
         
         # Add cabin class and baggage info from traveler pricing
-        if offer['travelerPricings']:
+        if offer.get('travelerPricings'):
             traveler = offer['travelerPricings'][0]  # Assuming single traveler
-            pruned_offer['cabin'] = traveler['fareDetailsBySegment'][0]['cabin']
-            pruned_offer['includedBags'] = traveler['fareDetailsBySegment'][0]['includedCheckedBags']['quantity']
+            fare = (traveler.get('fareDetailsBySegment') or [{}])[0]
+            # Checked bags are allowed either by count or by total weight
+            bags = fare.get('includedCheckedBags', {})
+            pruned_offer['cabin'] = fare.get('cabin')
+            pruned_offer['includedBags'] = bags.get('quantity')
+            if 'weight' in bags:
+                pruned_offer['includedBagWeight'] = f"{bags['weight']} {bags.get('weightUnit', '')}".strip()
         
         pruned_offers.append(pruned_offer)
     
     return pruned_offers
 
-def search_flights(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
-                   orig_date: str, dept_date: str,
-                   infant_count: int, child_count: int, adult_count: int):
+def build_travelers(infant_count: int, child_count: int, adult_count: int):
     travelers = []
     id = 1
     for _ in range(adult_count):
@@ -281,7 +604,14 @@ def search_flights(orig_location_code: str, dest_location_code: str, dest2_locat
     for i in range(infant_count):
         travelers.append({'id': str(id), 'travelerType': 'HELD_INFANT', 'associatedAdultId': str(i + 1)})
         id += 1
-    body =  {
+    return travelers
+
+def build_flight_search_body(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
+                             orig_date: str, dept_date: str,
+                             infant_count: int, child_count: int, adult_count: int,
+                             max_offers: int = None):
+    """Build the flight-offers POST body for an open-jaw round trip."""
+    return {
                 'currencyCode': 'USD',
                 'originDestinations': [{'id': '1',
                                         'originLocationCode': orig_location_code,
@@ -293,26 +623,68 @@ def search_flights(orig_location_code: str, dest_location_code: str, dest2_locat
                                         'destinationLocationCode': orig_location_code,
                                         'departureDateTimeRange': {'date': dept_date,
                                                                     'time': '00:00:00'}}],
-                'travelers': travelers,
+                'travelers': build_travelers(infant_count, child_count, adult_count),
                 'sources': ['GDS'],
-                'searchCriteria': {'maxFlightOffers': 4}
+                'searchCriteria': {'maxFlightOffers': max_offers or FLIGHT_FETCH_LIMIT}
             }
+
+def search_flights(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
+                   orig_date: str, dept_date: str,
+                   infant_count: int, child_count: int, adult_count: int,
+                   output_format: str = 'text', fields: str = None, limit: int = None, offset: int = 0):
+    body = build_flight_search_body(orig_location_code, dest_location_code, dest2_location_code,
+                                    orig_date, dept_date,
+                                    infant_count, child_count, adult_count)
     try:
-        print("Request body:")
-        print(json.dumps(body, indent=2))
-        response = amadeus.shopping.flight_offers_search.post(body)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request body: %s", json.dumps(body, indent=2))
+        key = flight_search_key(body)
+        data = flight_cache.get_or_compute(
+            key,
+            lambda: call_with_rate_limit_retry(lambda: amadeus.shopping.flight_offers_search.post(body)).data
+        )
         # with open('test.json', 'w') as f:
         #     f.write(response.data)
         # flight_offers = prune_flight_offers(response.data)
         # with open('flight_offers.pkl', 'wb') as f:
         #     pickle.dump(flight_offers, f)
         # return flight_offers
-        return flight_summary(parse_flight_data(response.data))
+        return render_flight_offers(data, output_format, fields, limit, offset)
     except ResponseError as error:
-        print("Amadeus error:", error)
+        logger.error("Amadeus error: %s", error)
         if hasattr(error, 'response') and hasattr(error.response, 'body'):
-            print("Error body:", error.response.body)
+            logger.error("Error body: %s", error.response.body)
         raise error
+
+async def async_fetch_flight_offers(body):
+    """POST a flight-offers body through the shared async client, via the flight cache."""
+    client = get_async_client()
+    try:
+        with span('flight_offers_search', legs=len(body['originDestinations'])):
+            return await flight_cache.get_or_load(
+                flight_search_key(body),
+                lambda: client.post('/v2/shopping/flight-offers', body, priority=Priority.FLIGHTS)
+            )
+    except AmadeusAPIError as error:
+        logger.error("Amadeus error: %s", error)
+        logger.error("Error body: %s", error.body)
+        raise error
+
+async def async_search_flights(orig_location_code: str, dest_location_code: str, dest2_location_code: str,
+                               orig_date: str, dept_date: str,
+                               infant_count: int, child_count: int, adult_count: int,
+                               output_format: str = 'text', fields: str = None,
+                               limit: int = None, offset: int = 0, on_result=None):
+    """
+    Async version of search_flights using the pooled Amadeus client.
+    `on_result(block, total)` receives each flight option of the text summary as it is rendered.
+    """
+    body = build_flight_search_body(orig_location_code, dest_location_code, dest2_location_code,
+                                    orig_date, dept_date,
+                                    infant_count, child_count, adult_count)
+    data = await async_fetch_flight_offers(body)
+    return await async_render_flight_offers(data, output_format, fields, limit, offset,
+                                            on_result=on_result)
     
 if __name__ == "__main__":
     print(search_flights('LAX', 'TPE', 'TPE', '2025-08-01', '2025-08-07', 0, 0, 2))
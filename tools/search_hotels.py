@@ -1,10 +1,19 @@
 from amadeus import Client, ResponseError
+import asyncio
 from dotenv import load_dotenv
+import logging
 import os
 from datetime import datetime
+from tools.amadeus_client import get_async_client, get_sync_client
+from tools.amadeus_scheduler import Priority, call_with_rate_limit_retry
+from tools.hotel_directory import HotelDirectory
+from tools.tracing import span
 
 load_dotenv()
-amadeus = Client()
+
+logger = logging.getLogger(__name__)
+
+amadeus = get_sync_client()
 
 def convert_hotel_offers_to_text(hotel_data):
     """
@@ -161,26 +170,140 @@ def extract_room_size(description):
         return f"{sqft} sq ft ({sqm} sq m)"
     return None
 
-def list_hotels(city_code):
+async def _async_fetch_hotel_list(city_code):
     """
     List hotels in a city using Amadeus hotel search.
     """
-    response = amadeus.get('/v1/reference-data/locations/hotels/by-city', cityCode=city_code)
-    hotels = response.data
+    hotels = await get_async_client().get('/v1/reference-data/locations/hotels/by-city',
+                                          priority=Priority.HOTEL_LIST, cityCode=city_code)
     return hotels[0:20]
 
+hotel_directory = HotelDirectory(
+    _async_fetch_hotel_list,
+    path=os.getenv('HOTEL_DIRECTORY_DB', 'cache/hotel_directory.sqlite3'),
+    ttl=float(os.getenv('HOTEL_DIRECTORY_TTL', str(7 * 24 * 3600))),
+    empty_ttl=float(os.getenv('HOTEL_DIRECTORY_EMPTY_TTL', '300'))
+)
+
+def list_hotels(city_code):
+    """
+    List hotels in a city, served from the local hotel directory. Blocking;
+    call from a worker thread while the server's event loop runs.
+    """
+    return hotel_directory.get(city_code)
+
+def preload_hotel_directory():
+    """Warm the hotel directory for the cities listed in HOTEL_DIRECTORY_PRELOAD; call from the event loop."""
+    hotel_directory.preload(os.getenv('HOTEL_DIRECTORY_PRELOAD', '').split(','))
+
 def search_hotels(city_code, check_in, check_out, adults=1):
     """
     List hotels and fetch offers for each.
     """
-    hotels = list_hotels(city_code)
+    with span('list_hotels', city_code=city_code):
+        hotels = list_hotels(city_code)
     hotel_ids = [hotel['hotelId'] for hotel in hotels]
-    print(hotel_ids, adults, check_in, check_out)
-    response = amadeus.shopping.hotel_offers_search.get(hotelIds=','.join(hotel_ids), adults=adults, checkInDate=check_in, checkOutDate=check_out, roomQuantity=1)
+    logger.debug("Hotel offers for %s: %d hotels, %s adults, %s to %s",
+                 city_code, len(hotel_ids), adults, check_in, check_out)
+    with span('hotel_offers_search', city_code=city_code, hotels=len(hotel_ids)):
+        response = call_with_rate_limit_retry(
+            lambda: amadeus.shopping.hotel_offers_search.get(hotelIds=','.join(hotel_ids), adults=adults, checkInDate=check_in, checkOutDate=check_out, roomQuantity=1)
+        )
     return response.data
 
+async def async_search_hotels(city_code, check_in, check_out, adults=1):
+    """
+    Async version of search_hotels using the pooled Amadeus client.
+    """
+    with span('list_hotels', city_code=city_code):
+        hotels = await hotel_directory.aget(city_code)
+    hotel_ids = [hotel['hotelId'] for hotel in hotels]
+    logger.debug("Hotel offers for %s: %d hotels, %s adults, %s to %s",
+                 city_code, len(hotel_ids), adults, check_in, check_out)
+    with span('hotel_offers_search', city_code=city_code, hotels=len(hotel_ids)):
+        return await get_async_client().get('/v3/shopping/hotel-offers', priority=Priority.HOTEL_OFFERS,
+                                            hotelIds=','.join(hotel_ids), adults=adults,
+                                            checkInDate=check_in, checkOutDate=check_out, roomQuantity=1)
+
+def trip_hotel_legs(city_codes, orig_date, dest_dates):
+    """
+    Pair each destination city with its stay dates.
+
+    The first stay starts on the trip's origin date and every stay ends on the
+    matching entry of `dest_dates`, which is also the next stay's check-in.
+
+    Returns:
+        list: (city_code, check_in, check_out) tuples in trip order
+    """
+    legs = []
+    for i, city_code in enumerate(city_codes):
+        check_in = orig_date if i == 0 else dest_dates[i - 1]
+        check_out = dest_dates[i]
+        legs.append((city_code, check_in, check_out))
+    return legs
+
+async def async_search_trip_hotels(city_codes_str, orig_date, dest_dates_str, adults=1, on_result=None):
+    """
+    Search hotels for every city of a trip concurrently on the event loop,
+    through the pooled Amadeus client.
+
+    `on_result(block, total)` receives each city's block as soon as that city
+    finishes, in completion order; the returned text stays in trip order.
+
+    Args:
+        city_codes_str: Comma-separated city codes in trip order
+        orig_date: Check-in date for the first city
+        dest_dates_str: Comma-separated check-out dates, one per city
+        adults: Number of adult guests
+
+    Returns:
+        str: One markdown block per city, in trip order. A city whose search
+        fails gets an error line instead of offers; the other cities are unaffected.
+    """
+    outcomes = await async_trip_hotel_outcomes(city_codes_str, orig_date, dest_dates_str, adults, on_result)
+    return "".join(block for _, _, block in outcomes)
+
+async def async_trip_hotel_outcomes(city_codes_str, orig_date, dest_dates_str, adults=1, on_result=None):
+    """
+    Search every city of a trip concurrently and keep each city's outcome.
+
+    Returns:
+        list: (leg, error, block) per city in trip order, where `error` is the
+        exception the city's search raised (None on success) and `block` its
+        rendered text
+    """
+    legs = trip_hotel_legs(city_codes_str.split(','), orig_date, dest_dates_str.split(','))
+
+    async def search_city(leg):
+        city_code, check_in, check_out = leg
+        error = None
+        with span('search_city_hotels', city_code=city_code):
+            try:
+                result = await async_search_hotels(city_code, check_in, check_out, adults)
+            except Exception as e:
+                result = error = e
+            block = format_city_hotels(leg, result)
+        if on_result is not None:
+            await on_result(block, len(legs))
+        return leg, error, block
+
+    return await asyncio.gather(*(search_city(leg) for leg in legs))
+
+def format_city_hotels(leg, result):
+    """
+    Render one city's hotel block; `result` is the offers list or the exception the search raised.
+    """
+    city_code, check_in, check_out = leg
+    if isinstance(result, BaseException):
+        logger.warning("Hotel search for %s failed: %s", city_code, result)
+        text = f"Hotel search failed: {result}"
+    else:
+        with span('convert_hotel_offers_to_text', offers=len(result)):
+            text = convert_hotel_offers_to_text(result)
+    return f"# Hotels in {city_code} from {check_in} to {check_out}:\n{text}\n\n"
+
 if __name__ == "__main__":
-    print(convert_hotel_offers_to_text(search_hotels("NYC", "2025-07-01", "2025-07-05", 2)))  # Example usage
+    print(convert_hotel_offers_to_text(asyncio.run(async_search_hotels("NYC", "2025-07-01", "2025-07-05", 2))))  # Example usage
     # city_code = "NYC"
     # check_in = "2025-07-01"
     # check_out = "2025-07-05"
@@ -0,0 +1,254 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    One timed operation in a trace.
+
+    Ids follow the OpenTelemetry format (32 hex digit trace id, 16 hex digit
+    span id), so exported spans can be loaded into OTel-compatible tooling.
+    """
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'status', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.end = None
+        self.attributes = attributes or {}
+        self.status = 'ok'
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration_ms': round(self.duration_ms, 3),
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in for spans of unsampled traces; recording on it does nothing."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span = ContextVar('current_span', default=None)
+
+
+class MemoryExporter:
+    """Keeps the most recent finished spans in memory."""
+
+    def __init__(self, maxlen: int = 10000):
+        self._spans = deque(maxlen=maxlen)
+
+    def export(self, span: Span):
+        self._spans.append(span.to_dict())
+
+    def spans(self, trace_id: str = None):
+        spans = list(self._spans)
+        return [span for span in spans if span['trace_id'] == trace_id] if trace_id else spans
+
+    def flush(self):
+        pass
+
+
+class FileExporter:
+    """
+    Appends finished spans to a JSON-lines file.
+
+    Spans are buffered and handed to a writer thread when a trace's root span
+    ends or the buffer fills up, so the file is touched about once per tool
+    call and never from the event loop. `flush()` waits until everything
+    handed over so far is written.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 256):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._writer = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, span: Span):
+        with self._lock:
+            self._buffer.append(span.to_dict())
+            if span.parent_id is not None and len(self._buffer) < self.buffer_size:
+                return
+            lines, self._buffer = self._buffer, []
+        self._submit(lines)
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if lines:
+            self._submit(lines)
+        self._pending.join()
+
+    def _submit(self, spans):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='trace-writer', daemon=True)
+                self._writer.start()
+        self._pending.put(spans)
+
+    def _run(self):
+        while True:
+            spans = self._pending.get()
+            try:
+                self._write(spans)
+            finally:
+                self._pending.task_done()
+
+    def _write(self, spans):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(span, default=str) + '\n' for span in spans))
+        except OSError as e:
+            logger.warning("Could not write %d spans to %s: %s", len(spans), self.path, e)
+
+
+class Tracer:
+    """
+    Creates spans and hands finished spans of sampled traces to an exporter.
+
+    The sampling decision is made once per trace, when a span starts with no
+    parent in the current context. Spans of unsampled traces are a shared
+    no-op object, so instrumented code costs almost nothing when tracing is
+    off (sample_rate 0) or a trace is not sampled. Parent spans propagate
+    through contextvars, so they follow asyncio tasks created with
+    asyncio.gather/create_task.
+
+    Args:
+        sample_rate: Fraction of traces to record, 0.0 to 1.0
+        exporter: Receives every finished span of a sampled trace
+    """
+
+    def __init__(self, sample_rate: float = 0.0, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter or MemoryExporter()
+
+    @classmethod
+    def from_env(cls):
+        kind = os.getenv('TRACE_EXPORTER', 'memory').lower()
+        if kind == 'file':
+            exporter = FileExporter(os.getenv('TRACE_FILE', 'traces/spans.jsonl'))
+        elif kind == 'memory':
+            exporter = MemoryExporter(int(os.getenv('TRACE_MEMORY_SPANS', '10000')))
+        else:
+            raise ValueError(f"TRACE_EXPORTER must be 'memory' or 'file', not {kind!r}")
+        return cls(float(os.getenv('TRACE_SAMPLE_RATE', '0')), exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the enclosed block as a span, child of the current span if there is one."""
+        parent = _current_span.get()
+        if parent is NOOP_SPAN:
+            yield NOOP_SPAN
+            return
+        if parent is None:
+            if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+                # Unsampled trace: children see the no-op span and skip recording
+                token = _current_span.set(NOOP_SPAN)
+                try:
+                    yield NOOP_SPAN
+                finally:
+                    _current_span.reset(token)
+                return
+            span = Span(name, f'{random.getrandbits(128):032x}', None, attributes)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.status = 'error'
+            span.error = f"{type(error).__name__}: {error}"
+            raise
+        finally:
+            span.end = time.time()
+            _current_span.reset(token)
+            self.exporter.export(span)
+
+    def flush(self):
+        self.exporter.flush()
+
+
+_tracer = None
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from the environment."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer.from_env()
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """Context manager timing a span on the process-wide tracer."""
+    return get_tracer().span(name, **attributes)
+
+
+def current_span():
+    """The active span, or the no-op span outside a sampled trace."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def traced(name: str = None):
+    """Decorator running each call of a function (sync or async) in a span."""
+    def decorate(function):
+        span_name = name or function.__qualname__
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+__all__ = ["Span", "NOOP_SPAN", "MemoryExporter", "FileExporter", "Tracer", "get_tracer", "span", "current_span",
+           "traced"]